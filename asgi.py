@@ -0,0 +1,550 @@
+"""Asyncio serving mode for the exam monitor: `uvicorn asgi:app`.
+
+Under gunicorn's gthread worker every /stream viewer pins a thread for the
+life of its connection, so a few open dashboards can starve screenshot
+ingest. Here the long-lived and hot routes run as coroutines on the event
+loop instead:
+
+  * GET  /stream        -- SSE, one cheap task per viewer
+  * GET  /sync          -- delta long-poll, same
+  * GET  pages and logo -- straight from the in-memory asset store
+  * GET  /screen/<id>/mjpeg -- one student's frames for the modal, one task each
+  * GET  /signal/inbox/<id> -- a student waiting for WebRTC signaling messages
+  * WS   /ws/student    -- a student's frames over one socket (see student_socket)
+  * WS   /ws/viewer     -- binary frames (and optionally events) for viewers
+  * POST /live-update   -- raw-image and JSON bodies, read without a thread
+  * POST /flag          -- same
+
+Apart from the pages, each is also served under /s/<session>/ for that
+exam session.
+Every other route (and multipart uploads) is the unchanged Flask app from
+server.py, run on a small thread pool, so routes and payloads are identical
+in both modes. Run one process, or several with STATE_BACKEND_URL set so
+they share state through Redis (see state.py).
+"""
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from io import BytesIO
+from urllib.parse import parse_qsl
+
+import server
+from compression import MIN_SIZE, StreamCompressor, compress, negotiate
+from sse import HEARTBEAT
+
+HEARTBEAT_SECONDS = 30
+
+wsgi_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('WSGI_THREADS', 16)),
+    thread_name_prefix='wsgi'
+)
+
+CORS_HEADERS = [(b'access-control-allow-origin', b'*')]
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] == 'websocket':
+        session, path = split_session(scope['path'])
+        handler = SOCKET_ROUTES.get(path)
+        # A student's socket opens its session; a viewer's needs one already open
+        exam = server.exams.get(session, create=path == '/ws/student') if handler else None
+        if exam is None:
+            await receive()  # websocket.connect
+            await send({'type': 'websocket.close', 'code': 4404})
+        else:
+            await handler(exam, scope, receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    if scope['path'] in server.STATIC_ROUTES and scope['method'] == 'GET':
+        await send_asset(server.STATIC_ROUTES[scope['path']], scope, send)
+        return
+    session, path = split_session(scope['path'])
+    route = native_route(path, scope, receive, send)
+    exam = server.exams.get(session, create=opens_session(path)) if route else None
+    if exam is None:
+        # Flask answers everything else, and a bad, unopened or one-too-many session
+        await run_wsgi(scope, receive, send)
+    else:
+        await route(exam)
+
+def split_session(path):
+    """(session, path within it) for `/s/<session>/...`; plain paths are session `default`."""
+    if not path.startswith('/s/'):
+        return server.DEFAULT_SESSION, path
+    session, _, rest = path[len('/s/'):].partition('/')
+    return session, '/' + rest
+
+def opens_session(path):
+    """True for the native routes students send to, which open their session like in server.py."""
+    return path in INGEST_ROUTES or path.startswith('/signal/inbox/')
+
+def native_route(path, scope, receive, send):
+    """The native handler for `path` as a function of the exam session; None for Flask's routes."""
+    method = scope['method']
+    if path == '/stream' and method == 'GET':
+        return lambda exam: stream(exam, scope, receive, send)
+    if path == '/sync' and method == 'GET':
+        return lambda exam: sync(exam, scope, receive, send)
+    if path.startswith('/screen/') and path.endswith('/mjpeg') and method == 'GET':
+        return lambda exam: mjpeg(exam, path[len('/screen/'):-len('/mjpeg')], receive, send)
+    if path.startswith('/signal/inbox/') and method == 'GET':
+        return lambda exam: signal_inbox(exam, path[len('/signal/inbox/'):], scope, receive, send)
+    if path in INGEST_ROUTES and method == 'POST' and not is_multipart(scope):
+        return lambda exam: ingest(exam, INGEST_ROUTES[path], scope, receive, send)
+    return None
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            wsgi_pool.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+# --- Native routes ---
+
+async def stream(exam, scope, receive, send):
+    """Server-Sent Events without a thread per viewer"""
+    if not exam.admits_viewer():
+        await send_json(send, {'error': 'this exam session has too many viewers'}, 429)
+        return
+    loop = asyncio.get_running_loop()
+    wakeup = asyncio.Event()
+    args = query_args(scope)
+    subscriber = exam.hub.subscribe(
+        notify=lambda: loop.call_soon_threadsafe(wakeup.set),
+        last_event_id=server.parse_last_event_id(header(scope, b'last-event-id') or args.get('lastEventId'))
+    )
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    coding = negotiate(header(scope, b'accept-encoding')) if server.SSE_COMPRESSION else None
+    compressor = StreamCompressor(coding) if coding else None
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'vary', b'Accept-Encoding'),
+            *([(b'content-encoding', coding.encode('ascii'))] if coding else []),
+            *CORS_HEADERS
+        ]
+    })
+    try:
+        while not disconnected.done():
+            wakeup.clear()
+            event = subscriber.get(0)
+            if event is None:
+                # Sleep until an event is published, the viewer leaves, or it's heartbeat time
+                waiter = asyncio.ensure_future(wakeup.wait())
+                done, _ = await asyncio.wait(
+                    [waiter, disconnected],
+                    timeout=HEARTBEAT_SECONDS,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                waiter.cancel()
+                if done:
+                    continue
+            chunk = HEARTBEAT if event is None else event.data
+            if compressor:
+                chunk = server.compression_stats.timed('stream', compressor.compress, chunk)
+            await send({
+                'type': 'http.response.body',
+                'body': chunk,
+                'more_body': True
+            })
+    except EOFError:
+        # Evicted as a slow consumer; EventSource reconnects with a fresh buffer
+        if not disconnected.done():
+            await send({'type': 'http.response.body', 'body': compressor.finish() if compressor else b''})
+    finally:
+        exam.hub.unsubscribe(subscriber)
+        disconnected.cancel()
+
+async def sync(exam, scope, receive, send):
+    """Delta long-poll; a waiting viewer is a parked coroutine, not a thread"""
+    loop = asyncio.get_running_loop()
+    server.capture_rate.viewer_polled(exam.name)
+    cursor, flags_since, viewer_id, wait = server.sync_params(query_args(scope))
+    if cursor is None:
+        # A snapshot reads the flag database (and maybe Redis): off the loop
+        payload = await loop.run_in_executor(wsgi_pool, server.sync_snapshot, exam, flags_since, viewer_id)
+        await send_json(send, payload, accept_encoding=header(scope, b'accept-encoding'), route='sync')
+        return
+    if not exam.admits_viewer():
+        await send_json(send, {'error': 'this exam session has too many viewers'}, 429)
+        return
+
+    wakeup = asyncio.Event()
+    subscriber = exam.hub.subscribe(
+        notify=lambda: loop.call_soon_threadsafe(wakeup.set),
+        last_event_id=cursor
+    )
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    waiter = asyncio.ensure_future(wakeup.wait())
+    try:
+        if not len(subscriber):
+            await asyncio.wait([waiter, disconnected], timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+        if disconnected.done():
+            return
+        events = server.drain(subscriber)
+    except EOFError:
+        events = []
+    finally:
+        exam.hub.unsubscribe(subscriber)
+        waiter.cancel()
+        disconnected.cancel()
+    payload = await loop.run_in_executor(wsgi_pool, server.sync_response, exam, cursor, events, flags_since, viewer_id)
+    await send_json(send, payload, accept_encoding=header(scope, b'accept-encoding'), route='sync')
+
+async def mjpeg(exam, student_id, receive, send):
+    """Same stream as server.screen_mjpeg, without a thread per open modal"""
+    if not exam.admits_viewer():
+        await send_json(send, {'error': 'this exam session has too many viewers'}, 429)
+        return
+    loop = asyncio.get_running_loop()
+    wakeup = asyncio.Event()
+    subscriber = exam.hub.subscribe(notify=lambda: loop.call_soon_threadsafe(wakeup.set))
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', server.MJPEG_MIMETYPE.encode('ascii')),
+            (b'cache-control', b'no-cache'),
+            *CORS_HEADERS
+        ]
+    })
+    try:
+        part = await loop.run_in_executor(wsgi_pool, server.mjpeg_part, exam, student_id)
+        while not disconnected.done():
+            if part is not None:
+                server.capture_rate.mark_watched(server.capture_key(exam, student_id))
+                await send({'type': 'http.response.body', 'body': part[1], 'more_body': True})
+            # Wait for this student's next frame; on a quiet spell resend the last one
+            while not disconnected.done():
+                wakeup.clear()
+                event = subscriber.get(0)
+                if event is None:
+                    waiter = asyncio.ensure_future(wakeup.wait())
+                    done, _ = await asyncio.wait(
+                        [waiter, disconnected],
+                        timeout=HEARTBEAT_SECONDS,
+                        return_when=asyncio.FIRST_COMPLETED
+                    )
+                    waiter.cancel()
+                    if not done:
+                        break
+                    continue
+                etag = server.mjpeg_update(event, student_id)
+                if etag is not None and (part is None or etag != part[0]):
+                    part = await loop.run_in_executor(wsgi_pool, server.mjpeg_part, exam, student_id, etag)
+                    break
+    except EOFError:
+        # Evicted as a slow consumer; the <img> is reloaded on the next modal open
+        if not disconnected.done():
+            await send({'type': 'http.response.body', 'body': b''})
+    except OSError:
+        # The modal closed mid-frame
+        pass
+    finally:
+        exam.hub.unsubscribe(subscriber)
+        disconnected.cancel()
+
+async def signal_inbox(exam, student_id, scope, receive, send):
+    """Same as server.get_signals; a waiting student is a parked coroutine, not a thread"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + server.signal_wait(query_args(scope))
+    wakeup = asyncio.Event()
+    notify = lambda: loop.call_soon_threadsafe(wakeup.set)
+    server.watch_signals(exam, student_id, notify)
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        # Watching first, so a message posted while we look can't be missed
+        messages = await loop.run_in_executor(wsgi_pool, server.take_signals, exam, student_id)
+        while not messages and loop.time() < deadline:
+            waiter = asyncio.ensure_future(wakeup.wait())
+            await asyncio.wait([waiter, disconnected], timeout=deadline - loop.time(),
+                               return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+            if disconnected.done():
+                return
+            if not wakeup.is_set():
+                break
+            wakeup.clear()
+            messages = await loop.run_in_executor(wsgi_pool, server.take_signals, exam, student_id)
+    finally:
+        server.unwatch_signals(exam, student_id, notify)
+        disconnected.cancel()
+    await send_json(send, {'messages': messages})
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+async def ingest(exam, record, scope, receive, send):
+    """Screenshot ingest: the body is read on the loop, only recording uses the pool"""
+    body = await read_body(receive)
+    args = query_args(scope)
+    content_type = header(scope, b'content-type').split(';')[0].strip().lower()
+    upload = server.parse_screenshot_body(content_type, body, args)
+    # Recording decodes a thumbnail and may talk to the shared backend; keep it off the loop
+    payload, status = await asyncio.get_running_loop().run_in_executor(wsgi_pool, record, exam, *upload)
+    await send_json(send, payload, status)
+
+async def send_asset(name, scope, send):
+    """A page or the logo from memory: no thread hop, no Flask"""
+    args = query_args(scope)
+    status, headers, body = server.static.serve(
+        name, header(scope, b'accept-encoding'), header(scope, b'if-none-match'), args.get('v')
+    )
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(key.lower().encode('latin-1'), value.encode('latin-1')) for key, value in headers]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+# --- WebSockets ---
+
+async def student_socket(exam, scope, receive, send):
+    """Live frames from one student, over one connection.
+
+    A text message is JSON metadata (currentUrl, currentTitle, ...) that
+    applies to every following frame; a binary message is one JPEG frame.
+    Each frame is answered with the same JSON as POST /live-update.
+    """
+    loop = asyncio.get_running_loop()
+    student_id = query_args(scope).get('studentId')
+    await receive()  # websocket.connect
+    if not student_id:
+        await send({'type': 'websocket.close', 'code': 4400})
+        return
+    await send({'type': 'websocket.accept'})
+    meta = {}
+    while True:
+        message = await receive()
+        if message['type'] == 'websocket.disconnect':
+            return
+        if message.get('text') is not None:
+            try:
+                meta = dict(json.loads(message['text']))
+            except (ValueError, TypeError):
+                continue
+        elif message.get('bytes'):
+            data = {
+                **meta,
+                'studentId': student_id,
+                'timestamp': datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+            }
+            payload, _ = await loop.run_in_executor(
+                wsgi_pool, server.record_live_update, exam, data, message['bytes'], 'image/jpeg'
+            )
+            await send({'type': 'websocket.send', 'text': json.dumps(payload)})
+
+async def viewer_socket(exam, scope, receive, send):
+    """Frames for a viewer as binary packets (see server.frame_packet).
+
+    Every student's thumbnail on each update, plus full-size frames for the
+    student named by the last `{"watch": id}` text message (null to stop).
+    With ?events=1 the SSE events are sent too, as text.
+    """
+    loop = asyncio.get_running_loop()
+    with_events = query_args(scope).get('events') == '1'
+    await receive()  # websocket.connect
+    if not exam.admits_viewer():
+        await send({'type': 'websocket.close', 'code': 4429})
+        return
+    await send({'type': 'websocket.accept'})
+    wakeup = asyncio.Event()
+    subscriber = exam.hub.subscribe(notify=lambda: loop.call_soon_threadsafe(wakeup.set))
+    incoming = asyncio.ensure_future(receive())
+    watching = None
+
+    async def send_frame(student_id, size, etag=None):
+        packet = server.cached_frame_packet(exam, student_id, size, etag)
+        if packet is None:
+            # Reads the frame (maybe from Redis) and may scale it: off the loop
+            packet = await loop.run_in_executor(wsgi_pool, server.frame_packet, exam, student_id, size, etag)
+        if packet is not None:
+            await send({'type': 'websocket.send', 'bytes': packet})
+
+    try:
+        while True:
+            wakeup.clear()
+            event = subscriber.get(0)
+            if event is None:
+                waiter = asyncio.ensure_future(wakeup.wait())
+                await asyncio.wait([waiter, incoming], return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                if incoming.done():
+                    message = incoming.result()
+                    if message['type'] == 'websocket.disconnect':
+                        return
+                    try:
+                        watching = json.loads(message.get('text') or '{}').get('watch')
+                    except (ValueError, AttributeError):
+                        pass
+                    if watching:
+                        server.capture_rate.mark_watched(server.capture_key(exam, watching))
+                        await send_frame(watching, None)
+                    incoming = asyncio.ensure_future(receive())
+                continue
+            if with_events:
+                await send({'type': 'websocket.send', 'text': event.json.decode('utf-8')})
+            if event.type == 'live_screen_update':
+                student_id = event.message['studentId']
+                etag = event.message['data'].get('etag')
+                await send_frame(student_id, 'thumb', etag)
+                if student_id == watching:
+                    server.capture_rate.mark_watched(server.capture_key(exam, student_id))
+                    await send_frame(student_id, None, etag)
+    except EOFError:
+        # Evicted as a slow consumer; the page reconnects
+        await send({'type': 'websocket.close', 'code': 1013})
+    except OSError:
+        # The viewer left while a frame was being sent
+        pass
+    finally:
+        exam.hub.unsubscribe(subscriber)
+        incoming.cancel()
+
+SOCKET_ROUTES = {
+    '/ws/student': student_socket,
+    '/ws/viewer': viewer_socket,
+}
+
+INGEST_ROUTES = {
+    '/live-update': server.record_live_update,
+    '/flag': server.record_flag,
+}
+
+# --- Helpers ---
+
+def query_args(scope):
+    return dict(parse_qsl(scope['query_string'].decode('latin-1')))
+
+def header(scope, name, default=''):
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return default
+
+def is_multipart(scope):
+    return header(scope, b'content-type').startswith('multipart/')
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+async def send_json(send, payload, status=200, accept_encoding=None, route=None):
+    """JSON response; compressed (and counted under `route`) when negotiated and worth it."""
+    body = json.dumps(payload).encode('utf-8')
+    headers = [(b'content-type', b'application/json'), *CORS_HEADERS]
+    if route:
+        headers.append((b'vary', b'Accept-Encoding'))
+        coding = negotiate(accept_encoding)
+        if coding and len(body) >= MIN_SIZE:
+            body = server.compression_stats.timed(route, lambda data: compress(data, coding), body)
+            headers.append((b'content-encoding', coding.encode('ascii')))
+    headers.append((b'content-length', str(len(body)).encode('ascii')))
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': headers
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+# --- Flask fallback ---
+
+async def run_wsgi(scope, receive, send):
+    """Run the Flask app on the thread pool, streaming its body back to the loop"""
+    body = await read_body(receive)
+    environ = wsgi_environ(scope, body)
+    loop = asyncio.get_running_loop()
+
+    def send_from_thread(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    def call_app():
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started.append({
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+            })
+
+        result = server.app(environ, start_response)
+        try:
+            for chunk in result:
+                if started:
+                    send_from_thread(started.pop())
+                if chunk:
+                    send_from_thread({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if started:
+                send_from_thread(started.pop())
+            send_from_thread({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+    await loop.run_in_executor(wsgi_pool, call_app)
+
+def wsgi_environ(scope, body):
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'CONTENT_LENGTH': str(len(body)),
+    }
+    for key, value in scope['headers']:
+        name = key.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+            continue
+        if name == 'CONTENT_LENGTH':
+            continue
+        name = 'HTTP_' + name
+        environ[name] = environ[name] + ',' + value if name in environ else value
+    return environ
+
+if __name__ == '__main__':
+    import uvicorn
+    port = int(os.environ.get('PORT', 5001))
+    print(f"  Async mode: http://localhost:{port}/monitor")
+    uvicorn.run(app, host='0.0.0.0', port=port)
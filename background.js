@@ -192,41 +192,70 @@ async function sendEnhancedFlag(data) {
   }
 }
 
-// Periodic screenshot capture for live monitoring
-let liveMonitoringInterval = null;
+// Periodic screenshot capture for live monitoring. The server paces it:
+// every /live-update reply says when to send the next frame and at what
+// JPEG quality and width (next_interval_ms, quality, max_width).
+let liveMonitoringTimer = null;
+let liveCapture = { next_interval_ms: 5000, quality: 0.6, max_width: 960 };
+
+// Scale a captured frame down to max_width; the frame as a Blob either way
+async function fitWidth(dataUrl, maxWidth, quality) {
+  const blob = await (await fetch(dataUrl)).blob();
+  const bitmap = await createImageBitmap(blob);
+  if (!maxWidth || bitmap.width <= maxWidth) {
+    bitmap.close();
+    return blob;
+  }
+  const canvas = new OffscreenCanvas(maxWidth, Math.round(bitmap.height * maxWidth / bitmap.width));
+  canvas.getContext('2d').drawImage(bitmap, 0, 0, canvas.width, canvas.height);
+  bitmap.close();
+  return canvas.convertToBlob({ type: 'image/jpeg', quality });
+}
 
-function startLiveMonitoring() {
-  // Capture and send screenshot every 5 seconds
-  liveMonitoringInterval = setInterval(async () => {
-    try {
-      const tabs = await chrome.tabs.query({active: true, currentWindow: true});
-      if (tabs.length > 0 && tabs[0].url && !tabs[0].url.startsWith('chrome://')) {
-        const screenshot = await chrome.tabs.captureVisibleTab(null, {
-          format: 'png',
-          quality: 60  // Lower quality for live streaming
-        });
-
-        // Send live screenshot update
-        const liveUpdate = {
-          studentId: STUDENT_ID,
-          screenshot: screenshot,
-          currentUrl: tabs[0].url,
-          currentTitle: tabs[0].title,
-          timestamp: new Date().toISOString(),
-          type: 'LIVE_UPDATE'
-        };
-
-        await fetch(SERVER_URL.replace('/flag', '/live-update'), {
-          method: 'POST',
-          headers: {'Content-Type': 'application/json'},
-          body: JSON.stringify(liveUpdate)
-        });
+async function sendLiveUpdate() {
+  try {
+    const tabs = await chrome.tabs.query({active: true, currentWindow: true});
+    if (tabs.length > 0 && tabs[0].url && !tabs[0].url.startsWith('chrome://')) {
+      const screenshot = await chrome.tabs.captureVisibleTab(null, {
+        format: 'jpeg',
+        quality: Math.round(liveCapture.quality * 100)
+      });
+      const frame = await fitWidth(screenshot, liveCapture.max_width, liveCapture.quality);
+
+      // Raw JPEG body, metadata in the query string
+      const meta = new URLSearchParams({
+        studentId: STUDENT_ID,
+        currentUrl: tabs[0].url,
+        currentTitle: tabs[0].title || '',
+        timestamp: new Date().toISOString()
+      });
+      const response = await fetch(SERVER_URL.replace('/flag', '/live-update') + '?' + meta, {
+        method: 'POST',
+        headers: {'Content-Type': 'image/jpeg'},
+        body: frame
+      });
+      const reply = await response.json();
+      if (reply.next_interval_ms) {
+        liveCapture = reply;
       }
-    } catch (error) {
-      console.error('Live monitoring error:', error);
     }
-  }, 5000); // Every 5 seconds
+  } catch (error) {
+    console.error('Live monitoring error:', error);
+  }
+}
 
+function scheduleLiveUpdate() {
+  liveMonitoringTimer = setTimeout(async () => {
+    await sendLiveUpdate();
+    scheduleLiveUpdate();
+  }, liveCapture.next_interval_ms);
+}
+
+function startLiveMonitoring() {
+  if (liveMonitoringTimer !== null) {
+    return;  // started on install and on load: keep a single loop
+  }
+  scheduleLiveUpdate();
   console.log('📹 Live monitoring started');
 }
 
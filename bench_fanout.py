@@ -0,0 +1,65 @@
+"""Microbenchmark: cost of broadcasting one SSE event to N viewers.
+
+Compares the old per-viewer json.dumps (every /stream generator encoded
+the message itself) with EventHub's encode-once publish. Run it with
+
+    python bench_fanout.py > bench_output.txt
+"""
+import base64
+import json
+import os
+import time
+
+from sse import EventHub
+
+EVENTS = 50
+VIEWER_COUNTS = (1, 10, 50, 200, 500, 1000)
+
+# A worst case: a live update still carrying a ~100 KB inline frame
+MESSAGE = {
+    'type': 'live_screen_update',
+    'studentId': 'student-042',
+    'data': {
+        'screenshot': 'data:image/jpeg;base64,' + base64.b64encode(os.urandom(75_000)).decode('ascii'),
+        'currentUrl': 'https://example.com/quiz',
+        'currentTitle': 'Quiz 3',
+        'version': 1,
+    }
+}
+
+
+def per_viewer_encode(viewers):
+    """Old behavior: each viewer's generator serializes the message."""
+    for _ in range(EVENTS):
+        for _ in range(viewers):
+            f"data: {json.dumps(MESSAGE)}\n\n".encode('utf-8')
+
+
+def encode_once(viewers):
+    """EventHub: one encode per publish, then every viewer drains the shared bytes."""
+    hub = EventHub(maxlen=EVENTS + 1)
+    subscribers = [hub.subscribe() for _ in range(viewers)]
+    for _ in range(EVENTS):
+        hub.publish(MESSAGE)
+    for subscriber in subscribers:
+        while subscriber.get(0) is not None:
+            pass
+
+
+def timed(fn, viewers):
+    start = time.perf_counter()
+    fn(viewers)
+    return (time.perf_counter() - start) / EVENTS * 1000
+
+
+def main():
+    print(f'{EVENTS} events of {len(json.dumps(MESSAGE)) // 1024} KB each, ms per event:')
+    print(f"{'viewers':>8} {'per-viewer':>12} {'encode-once':>12} {'speedup':>8}")
+    for viewers in VIEWER_COUNTS:
+        old = timed(per_viewer_encode, viewers)
+        new = timed(encode_once, viewers)
+        print(f'{viewers:>8} {old:>12.3f} {new:>12.3f} {old / new:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+"""Content-addressed screenshot storage: every distinct image is kept once, under its hash.
+
+Live frames and flag screenshots refer to blobs by hash (the frame ETag):
+put() adds a reference and release() drops one. Blobs stay in memory, least
+recently used first. persist() writes flag evidence to
+`<root>/<hash[:2]>/<hash>` for good; other blobs spill to a per-process
+directory once memory is over `memory_bytes`. With a shared state backend,
+referenced bytes are kept there as well, so every worker can read them.
+"""
+import hashlib
+import os
+import queue
+import re
+import shutil
+import threading
+from collections import OrderedDict
+
+HASH_PATTERN = re.compile(r'^[0-9a-f]{24}$')
+
+
+def blob_hash(data):
+    """The address of `data`: 24 hex digits of blake2b."""
+    return hashlib.blake2b(data, digest_size=12).hexdigest()
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class BlobStore:
+    def __init__(self, root, memory_bytes=64 << 20, spill_bytes=1 << 30, url='/blob/{hash}', shared=None):
+        self.root = os.path.abspath(root)
+        self.memory_bytes = memory_bytes
+        self.spill_bytes = spill_bytes
+        self.url_format = url
+        # The state backend's shared_blobs(): every worker's references and bytes, or None in one process
+        self.shared = shared
+        self.stored = 0
+        self.deduplicated = 0
+        self.bytes_saved = 0
+        self.spilled = 0
+        self.spill_dropped = 0
+        self._memory = OrderedDict()  # {hash: (data, mimetype)}, least recently used first
+        self._memory_size = 0
+        self._refs = {}      # {hash: count}, one per put() not yet released (not used with `shared`)
+        self._spilling = {}  # {hash: (data, mimetype)} waiting for the spill writer
+        self._spill = OrderedDict()  # {hash: size}, oldest first
+        self._spill_size = 0
+        self._durable = set()  # durable blobs this process knows are on disk
+        self._lock = threading.Lock()
+        spill_root = os.path.join(self.root, 'spill')
+        self._spill_dir = os.path.join(spill_root, str(os.getpid()))
+        self._clear_spill(spill_root)
+        os.makedirs(self._spill_dir, exist_ok=True)
+        self._jobs = queue.Queue()  # (method, key) for the writer thread
+        threading.Thread(target=self._write_loop, name='blob-writer', daemon=True).start()
+
+    def url(self, key):
+        return self.url_format.format(hash=key)
+
+    def _clear_spill(self, spill_root):
+        """Delete this process's spill directory, and those of processes that have exited."""
+        try:
+            names = os.listdir(spill_root)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(spill_root, name)
+            if not name.isdigit():
+                if os.path.isfile(path):
+                    self._remove(path)  # spill file from before per-process directories
+                continue
+            if int(name) == os.getpid() or not _process_alive(int(name)):
+                shutil.rmtree(path, ignore_errors=True)
+
+    # --- Writes ---
+
+    def put(self, data, mimetype):
+        """Store `data` (or add a reference to the identical blob) and return its hash.
+
+        Every put() holds a reference until a matching release().
+        """
+        key = blob_hash(data)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._count_duplicate(data)
+            elif key in self._spilling or key in self._spill or self._is_durable(key):
+                self._count_duplicate(data)
+            else:
+                self._memory[key] = (data, mimetype)
+                self._memory_size += len(data)
+                self.stored += 1
+            if self.shared is None:
+                self._refs[key] = self._refs.get(key, 0) + 1
+            self._evict()
+        if self.shared is not None:
+            self.shared.acquire(key, data, mimetype)
+        return key
+
+    def _count_duplicate(self, data):
+        self.deduplicated += 1
+        self.bytes_saved += len(data)
+
+    def release(self, key):
+        """Drop one reference; a non-durable blob with none left is deleted."""
+        if self.shared is not None:
+            if self.shared.release(key) <= 0:
+                with self._lock:
+                    if key not in self._durable:
+                        self._drop_memory(key)
+            return
+        with self._lock:
+            count = self._refs.get(key)
+            if count is None:
+                return
+            if count > 1:
+                self._refs[key] = count - 1
+                return
+            del self._refs[key]
+            if key not in self._durable:
+                self._drop_memory(key)
+            self._spilling.pop(key, None)
+            spilled = self._spill.pop(key, None)
+            if spilled is not None:
+                self._spill_size -= spilled
+        if spilled is not None:
+            self._remove(self._spill_path(key))
+
+    def _drop_memory(self, key):
+        blob = self._memory.pop(key, None)
+        if blob is not None:
+            self._memory_size -= len(blob[0])
+
+    def persist(self, key):
+        """Write a blob to durable storage, where it stays for good. Blocking; call off the request path."""
+        with self._lock:
+            if self._is_durable(key):
+                return True
+            blob = self._memory.get(key) or self._spilling.get(key)
+            spilled = key in self._spill
+        if blob is None and spilled:
+            blob = self._read_file(self._spill_path(key))
+        if blob is None and self.shared is not None:
+            blob = self.shared.get(key)
+        if blob is None:
+            return False
+        path = self._durable_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._write_file(path, *blob)
+        with self._lock:
+            self._durable.add(key)
+        return True
+
+    def _evict(self):
+        """Drop blobs from memory until under budget, queueing referenced ones for the spill writer (lock held)."""
+        while self._memory_size > self.memory_bytes and len(self._memory) > 1:
+            key, blob = self._memory.popitem(last=False)
+            self._memory_size -= len(blob[0])
+            if key in self._refs and key not in self._durable:
+                self._spilling[key] = blob
+                self._jobs.put((self._spill_one, key))
+
+    def persist_later(self, key):
+        """persist() on the writer thread, then release() the caller's reference once the file is written."""
+        self._jobs.put((self._persist_and_release, key))
+
+    def _persist_and_release(self, key):
+        if self.persist(key):
+            self.release(key)
+        else:
+            print(f"⚠️  Blob {key} to persist is gone")
+
+    def _write_loop(self):
+        """Spill evicted blobs and persist flag evidence, off the request path."""
+        while True:
+            method, key = self._jobs.get()
+            try:
+                method(key)
+            except OSError as e:
+                print(f"⚠️  Blob write failed: {e}")  # a blob that fails to persist keeps its reference
+
+    def _spill_one(self, key):
+        with self._lock:
+            blob = self._spilling.get(key)
+        if blob is None:
+            return  # released before its turn
+        try:
+            self._write_file(self._spill_path(key), *blob)
+        except OSError:
+            with self._lock:
+                self._spilling.pop(key, None)
+            raise
+        with self._lock:
+            if self._spilling.pop(key, None) is None:
+                dropped = [key]  # released while we were writing
+            else:
+                self._spill[key] = len(blob[0])
+                self._spill_size += len(blob[0])
+                self.spilled += 1
+                dropped = []
+                while self._spill_size > self.spill_bytes and len(self._spill) > 1:
+                    old, size = self._spill.popitem(last=False)
+                    self._spill_size -= size
+                    self._refs.pop(old, None)
+                    self.spill_dropped += 1
+                    dropped.append(old)
+        for old in dropped:
+            self._remove(self._spill_path(old))
+
+    # --- Reads ---
+
+    def get(self, key):
+        """(data, mimetype) for a hash, or None."""
+        if not HASH_PATTERN.match(key):
+            return None
+        with self._lock:
+            blob = self._memory.get(key) or self._spilling.get(key)
+            if blob is not None:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                return blob
+            path = self._spill_path(key) if key in self._spill else self._durable_path(key)
+        blob = self._read_file(path)
+        if blob is not None and path == self._durable_path(key):
+            with self._lock:
+                self._durable.add(key)
+        elif blob is None and self.shared is not None:
+            blob = self.shared.get(key)  # a live frame another worker received
+        if blob is not None and path != self._spill_path(key):
+            # Evidence gets looked at in bursts (the dashboard, then the modal), and a
+            # live frame by every viewer of the student: keep it warm
+            with self._lock:
+                if key not in self._memory:
+                    self._memory[key] = blob
+                    self._memory_size += len(blob[0])
+                self._evict()
+        return blob
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._memory or key in self._spilling or key in self._spill:
+                return True
+        return bool(HASH_PATTERN.match(key)) and self._is_durable(key)
+
+    # --- Files: `mimetype\0data`, written whole then renamed into place ---
+
+    def _is_durable(self, key):
+        if key in self._durable:
+            return True
+        if os.path.exists(self._durable_path(key)):
+            self._durable.add(key)  # written by another worker or an earlier run
+            return True
+        return False
+
+    def _durable_path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _spill_path(self, key):
+        return os.path.join(self._spill_dir, key)
+
+    @staticmethod
+    def _write_file(path, data, mimetype):
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(mimetype.encode('ascii') + b'\0')
+            f.write(data)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _read_file(path):
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return None
+        mimetype, _, data = raw.partition(b'\0')
+        return data, mimetype.decode('ascii')
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'memory_blobs': len(self._memory),
+                'memory_bytes': self._memory_size,
+                'spill_blobs': len(self._spill),
+                'spill_bytes': self._spill_size,
+                'spill_queued': len(self._spilling),
+                'referenced': len(self._refs),
+                'stored': self.stored,
+                'deduplicated': self.deduplicated,
+                'bytes_saved': self.bytes_saved,
+                'spilled': self.spilled,
+                'spill_dropped': self.spill_dropped,
+            }
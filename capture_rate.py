@@ -0,0 +1,169 @@
+"""Server-driven capture cadence for students' live screenshots.
+
+Every /live-update reply tells the student when to send the next frame and
+at what JPEG quality/width. The controller shares a frame budget
+(INGEST_BUDGET_FPS) across the students who are currently sending:
+
+  * a student being watched in the monitor modal, or flagged in the last
+    couple of minutes, gets the full live rate and better quality;
+  * everyone else gets an equal share of what's left;
+  * a student whose screen hasn't changed for a while backs off further;
+  * a student some viewer already watches as live WebRTC video only sends
+    keyframes, for thumbnails, flags and the archive, even while watched
+    or flagged;
+  * with nobody watching their exam session, its students drop to the
+    idle rate.
+
+It then corrects against what it measures: if frames arrive faster than
+the budget (clients overshooting, or more students than expected), or
+the session's viewers' SSE buffers are backing up, intervals stretch and
+quality drops. The numbers are per worker process, which is fine for a
+feedback loop.
+"""
+import math
+import threading
+import time
+
+LIVE_INTERVAL_MS = 1000
+IDLE_INTERVAL_MS = 5000
+MAX_INTERVAL_MS = 15000
+KEYFRAME_INTERVAL_MS = 10000  # while a viewer has the student's live video track
+
+ACTIVE_WINDOW = 15.0    # a student counts as sending if seen this recently
+WATCH_WINDOW = 15.0     # a full-size fetch keeps a student "watched" this long
+FLAG_WINDOW = 120.0     # a flag keeps a student at the live rate this long
+RATE_HALF_LIFE = 5.0    # smoothing for the measured ingest rate
+
+QUALITY_WATCHED = {'quality': 0.5, 'max_width': 1280}
+QUALITY_NORMAL = {'quality': 0.3, 'max_width': 960}
+QUALITY_CONGESTED = {'quality': 0.25, 'max_width': 640}
+
+
+class CaptureRateController:
+    def __init__(self, budget_fps, viewer_count, queue_pressure, rtc_live=None, session_of=lambda student_id: None):
+        """`viewer_count(session)`, `queue_pressure(session)` (0..1) and `rtc_live(student_id)` are read
+        on every advise(); `session_of(student_id)` is the session whose viewers count for that student."""
+        self.budget_fps = budget_fps
+        self.viewer_count = viewer_count
+        self.queue_pressure = queue_pressure
+        self.rtc_live = rtc_live
+        self.session_of = session_of
+        self.keyframe_only = 0
+        self._last_seen = {}
+        self._watched = {}
+        self._flagged = {}
+        self._viewer_seen = {}  # {session: last poll}
+        self._pruned_at = 0
+        self._rate = 0.0
+        self._rate_at = time.time()
+        self._lock = threading.Lock()
+
+    def frame_received(self, student_id):
+        now = time.time()
+        with self._lock:
+            self._last_seen[student_id] = now
+            # Exponentially decayed event rate (frames/s)
+            decay = 0.5 ** ((now - self._rate_at) / RATE_HALF_LIFE)
+            self._rate = self._rate * decay + math.log(2) / RATE_HALF_LIFE
+            self._rate_at = now
+
+    def mark_watched(self, student_id):
+        now = time.time()
+        with self._lock:
+            self._watched[student_id] = now
+            self._prune(now)
+
+    def mark_flagged(self, student_id):
+        now = time.time()
+        with self._lock:
+            self._flagged[student_id] = now
+            self._prune(now)
+
+    def viewer_polled(self, session=None):
+        """Count a polling viewer (no SSE connection) as someone watching `session`."""
+        self._viewer_seen[session] = time.time()
+
+    def ingest_rate(self):
+        with self._lock:
+            return self._rate * 0.5 ** ((time.time() - self._rate_at) / RATE_HALF_LIFE)
+
+    def _counts(self, now):
+        with self._lock:
+            for student_id in [s for s, t in self._last_seen.items() if now - t > ACTIVE_WINDOW]:
+                del self._last_seen[student_id]
+            self._prune(now)
+            for session in [s for s, t in self._viewer_seen.items() if now - t > WATCH_WINDOW]:
+                del self._viewer_seen[session]
+            active = len(self._last_seen)
+            priority = sum(1 for s in self._last_seen if self._is_priority(s, now))
+            sessions = {self.session_of(s) for s in self._last_seen}
+        return active, priority, sessions
+
+    def _prune(self, now):
+        """Forget watched/flagged marks past their window, at most once a second (lock held).
+
+        Not tied to _last_seen: a student can flag without ever sending a frame.
+        """
+        if now - self._pruned_at < 1:
+            return
+        self._pruned_at = now
+        for marks, window in ((self._watched, WATCH_WINDOW), (self._flagged, FLAG_WINDOW)):
+            for student_id in [s for s, t in marks.items() if now - t > window]:
+                del marks[student_id]
+
+    def _is_priority(self, student_id, now):
+        return (now - self._watched.get(student_id, 0) < WATCH_WINDOW
+                or now - self._flagged.get(student_id, 0) < FLAG_WINDOW)
+
+    def _watched_session(self, session, now):
+        return self.viewer_count(session) > 0 or now - self._viewer_seen.get(session, 0) <= WATCH_WINDOW
+
+    def advise(self, student_id, unchanged=0):
+        """{'next_interval_ms', 'quality', 'max_width'} for this student's next frame."""
+        now = time.time()
+        active, priority, _ = self._counts(now)
+        session = self.session_of(student_id)
+        pressure = self.queue_pressure(session)
+        congested = pressure > 0.25
+
+        # First: the modal shows the live <video> then, so full-rate JPEGs would be redundant
+        if self.rtc_live is not None and self.rtc_live(student_id):
+            self.keyframe_only += 1
+            return {'next_interval_ms': KEYFRAME_INTERVAL_MS, **QUALITY_NORMAL}
+
+        if self._is_priority(student_id, now):
+            interval = LIVE_INTERVAL_MS
+            hint = QUALITY_CONGESTED if congested else QUALITY_WATCHED
+            return {'next_interval_ms': interval, **hint}
+
+        if not self._watched_session(session, now):
+            interval = IDLE_INTERVAL_MS
+        else:
+            # Equal share of the budget left after the priority students
+            spare_fps = max(self.budget_fps - priority * 1000 / LIVE_INTERVAL_MS, self.budget_fps * 0.1)
+            interval = max(LIVE_INTERVAL_MS, 1000 * max(active - priority, 1) / spare_fps)
+            # Static screens back off on top of their share
+            interval *= 1 + unchanged // 3
+
+        # Feedback: measured overshoot and backed-up viewers both stretch the interval
+        overshoot = self.ingest_rate() / self.budget_fps if self.budget_fps else 1
+        if overshoot > 1:
+            interval *= overshoot
+        if congested:
+            interval *= 1 + pressure
+
+        hint = QUALITY_CONGESTED if congested or overshoot > 1.5 else QUALITY_NORMAL
+        return {'next_interval_ms': int(min(interval, MAX_INTERVAL_MS)), **hint}
+
+    def stats(self):
+        now = time.time()
+        active, priority, sessions = self._counts(now)
+        return {
+            'budget_fps': self.budget_fps,
+            'ingest_fps': round(self.ingest_rate(), 2),
+            'active_students': active,
+            'priority_students': priority,
+            'watched_sessions': sum(1 for session in sessions if self._watched_session(session, now)),
+            'queue_pressure': round(max((self.queue_pressure(session) for session in sessions), default=0.0), 3),
+            'keyframe_only_advice': self.keyframe_only,
+        }
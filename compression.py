@@ -0,0 +1,105 @@
+"""Accept-Encoding negotiated compression for the JSON APIs and the SSE stream.
+
+JSON responses (/live-screens, /flags, /signal/offers, /sync, ...) are
+compressed whole with zstd or gzip, whichever the client prefers and we
+have. SDP offers and repeated screen metadata shrink several-fold.
+
+The SSE stream can't be compressed whole, since it never ends. A
+StreamCompressor keeps one compression context per connection and
+sync-flushes after every event. Each event goes out at once, and later
+events still reuse the keys and URLs of earlier ones.
+
+Every compression is counted per route (bytes in/out, CPU time) for
+/metrics, so the size threshold and levels can be tuned from real traffic.
+
+zstd needs `pip install zstandard`; without it only gzip is offered.
+"""
+import threading
+import time
+import zlib
+
+from static_assets import accepted_encodings
+
+try:
+    import zstandard
+except ImportError:  # gzip only
+    zstandard = None
+
+# Below this the framing overhead eats most of the saving
+MIN_SIZE = 512
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def negotiate(accept_encoding):
+    """Best coding we can produce that the client accepts, or None."""
+    accepted = accepted_encodings(accept_encoding)
+    if zstandard is not None and 'zstd' in accepted:
+        return 'zstd'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(data, coding):
+    if coding == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31 = gzip container
+    return compressor.compress(data) + compressor.flush()
+
+
+class StreamCompressor:
+    """One connection's compression context; every chunk is flushed whole."""
+
+    def __init__(self, coding):
+        self.coding = coding
+        if coding == 'zstd':
+            self._obj = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+            self._flush_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            self._obj = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self._flush_mode = zlib.Z_SYNC_FLUSH
+
+    def compress(self, chunk):
+        return self._obj.compress(chunk) + self._obj.flush(self._flush_mode)
+
+    def finish(self):
+        """Trailer that ends the stream cleanly."""
+        return self._obj.flush()
+
+
+class CompressionStats:
+    """Per-route totals: responses, bytes before and after, CPU spent."""
+
+    def __init__(self):
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def timed(self, route, fn, data):
+        """fn(data), with its input/output size and thread CPU time recorded under `route`."""
+        start = time.thread_time()
+        out = fn(data)
+        self.record(route, len(data), len(out), time.thread_time() - start)
+        return out
+
+    def record(self, route, bytes_in, bytes_out, cpu_seconds):
+        with self._lock:
+            totals = self._routes.setdefault(route, [0, 0, 0, 0.0])
+            totals[0] += 1
+            totals[1] += bytes_in
+            totals[2] += bytes_out
+            totals[3] += cpu_seconds
+
+    def stats(self):
+        with self._lock:
+            routes = {route: list(totals) for route, totals in self._routes.items()}
+        return {
+            route: {
+                'count': count,
+                'bytes_in': bytes_in,
+                'bytes_out': bytes_out,
+                'ratio': round(bytes_in / bytes_out, 2) if bytes_out else None,
+                'cpu_ms': round(cpu * 1000, 1),
+            }
+            for route, (count, bytes_in, bytes_out, cpu) in routes.items()
+        }
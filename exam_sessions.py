@@ -0,0 +1,160 @@
+"""Exam sessions (rooms): each exam's live state and event stream, kept apart.
+
+An ExamSession has its own maps in the state backend (under `<name>:<map>`;
+`default` keeps the bare names), its own EventHub and LivenessTracker, and
+per-session quotas of students and viewers. ExamSessions opens sessions and
+closes the ones left idle.
+"""
+import re
+import threading
+import time
+
+from liveness import LivenessTracker
+from sse import EventHub
+from state import FrameCodec, JSONCodec
+
+DEFAULT = 'default'
+NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class ExamSession:
+    def __init__(self, name, state, frame_sizes, on_status, hub_options=None, liveness_options=None,
+                 max_students=0, max_viewers=0):
+        """`on_status(session, student_id, status)` gets this session's liveness changes."""
+        self.name = name
+        self.state = state
+        self.max_students = max_students
+        self.max_viewers = max_viewers
+        self.rejected_students = 0
+        self.rejected_viewers = 0
+        # URLs the server hands out (screens, replay) carry the session
+        self.url_prefix = '' if name == DEFAULT else f'/s/{name}'
+        self.live_screens = self.map('live_screens')  # {studentId: {screenshot, url, timestamp, version, etag}}
+        self.live_frames = self.map('live_frame_etags')  # {studentId: blob hash of the latest frame}
+        self.frame_fingerprints = self.map('frame_fingerprints')  # {studentId: {fingerprint, unchanged}}
+        self.frame_variants = {size: self.map(f'live_frames_{size}', FrameCodec) for size in frame_sizes}
+        self.webrtc_offers = self.map('webrtc_offers')  # {session key: {studentId, viewerId, offer}}
+        self.signal_inbox = self.map('signal_inbox')    # {session key: message}
+        self.rtc_viewers = self.map('rtc_viewers')      # {studentId: {viewerId: report expiry}}
+        self.frame_packets = {}  # {(studentId, size): (source etag, packet)}, this worker only
+        self.mjpeg_parts = {}    # {studentId: (etag, part)}, this worker only
+        self.hub = EventHub(**(hub_options or {}))
+        self.liveness = LivenessTracker(
+            on_change=lambda student_id, status: on_status(self, student_id, status),
+            last_seen=self.map('student_last_seen'),
+            **(liveness_options or {})
+        )
+
+    def key(self, name):
+        """Backend name of this session's map or counter `name`."""
+        return name if self.name == DEFAULT else f'{self.name}:{name}'
+
+    def map(self, name, codec=JSONCodec):
+        return self.state.map(self.key(name), codec)
+
+    def admits_student(self, student_id):
+        """False when a student new to this session would go over max_students."""
+        if not self.max_students or student_id in self.live_screens:
+            return True
+        if len(self.live_screens) < self.max_students:
+            return True
+        self.rejected_students += 1
+        return False
+
+    def admits_viewer(self):
+        """False when one more viewer would go over max_viewers."""
+        if not self.max_viewers or len(self.hub) < self.max_viewers:
+            return True
+        self.rejected_viewers += 1
+        return False
+
+    def close(self):
+        """Stop this session's background work (ExamSessions closes idle sessions)."""
+        self.liveness.stop()
+
+    def stats(self):
+        return {
+            'students': len(self.live_screens),
+            'sse': self.hub.stats(),
+            'liveness': self.liveness.stats(),
+            'rejected_students': self.rejected_students,
+            'rejected_viewers': self.rejected_viewers,
+        }
+
+
+class ExamSessions:
+    """The sessions this worker has open.
+
+    A session is created by a student's ingest or an explicit open, and
+    closed again once it has had no students and no viewers for `idle_after`
+    seconds. `registry` ({name: last time it was in use}) can be a shared map,
+    so every worker finds a session any of them opened.
+    """
+
+    def __init__(self, factory, max_sessions=100, registry=None, idle_after=600, sweep_every=60):
+        self.factory = factory  # name -> ExamSession
+        self.max_sessions = max_sessions
+        self.idle_after = idle_after
+        self.registry = {} if registry is None else registry
+        self.closed = 0
+        self._sessions = {}
+        self._lock = threading.Lock()
+        threading.Thread(target=self._sweep_loop, args=(sweep_every,), name='exam-sessions', daemon=True).start()
+
+    def get(self, name, create=False):
+        """The session called `name`, or None.
+
+        Without `create`, only `default` and sessions opened on some worker are
+        found. Creating fails for a malformed name, or past max_sessions.
+        """
+        session = self._sessions.get(name)
+        if session is not None or not NAME_PATTERN.match(name or ''):
+            return session
+        if not create and name != DEFAULT and name not in self.registry:
+            return None
+        with self._lock:
+            session = self._sessions.get(name)
+            if session is None:
+                if name not in self.registry and len(self.registry) >= self.max_sessions:
+                    return None
+                self.registry[name] = time.time()
+                session = self._sessions[name] = self.factory(name)
+        return session
+
+    def close_idle(self, now=None):
+        """Close every session (but `default`) idle for idle_after seconds; returns their names."""
+        now = now or time.time()
+        closed = []
+        for session in self:
+            if session.name == DEFAULT:
+                continue
+            if len(session.hub) or len(session.liveness.last_seen):
+                self.registry[session.name] = now  # students (on any worker) or viewers here
+                continue
+            last_used = self.registry.get(session.name)
+            if last_used is not None and now - last_used < self.idle_after:
+                continue  # maybe in use on another worker
+            with self._lock:
+                self._sessions.pop(session.name, None)
+            self.registry.pop(session.name, None)
+            session.close()
+            closed.append(session.name)
+        self.closed += len(closed)
+        return closed
+
+    def _sweep_loop(self, every):
+        while True:
+            time.sleep(every)
+            try:
+                self.close_idle()
+            except Exception as e:
+                print(f"⚠️  Closing idle exam sessions failed: {e}")
+
+    def __contains__(self, name):
+        return name in self._sessions
+
+    def __iter__(self):
+        return iter(list(self._sessions.values()))
+
+    def __len__(self):
+        return len(self._sessions)
@@ -0,0 +1,312 @@
+"""Persistent, append-only flag storage on SQLite in WAL mode.
+
+Flags survive restarts and redeploys, and nothing but the write buffer
+stays in RAM, however long the exam runs. append() only assigns an id and
+queues the row; a background thread writes queued rows in batches, one
+transaction per batch, so receive_flag() never waits on the disk.
+Screenshot blobs live in their own table, so listing flags never reads
+image data. Given a BlobStore (blob_store.py), screenshots are stored there
+instead, once per distinct image, and the table only records their hash.
+
+Rows stay in the queue until their batch commits. Readers look at the
+queue first and then the database, so a flag is visible as soon as
+append() returns. The dashboard's totals (flags, students, domains) are
+kept up to date in memory by append() rather than counted per request.
+
+Every flag belongs to an exam session (its `session` field, `default`
+when absent), and the reads take the session to list.
+
+With `shared=True` (several worker processes on one database file) ids
+can't come from a per-process counter: a reader could see id 10 commit
+before id 9 and page past it. Then append() writes straight away and takes
+the id inside a BEGIN IMMEDIATE transaction, so ids are in commit order.
+"""
+import atexit
+import json
+import sqlite3
+import threading
+import time
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS flags (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL DEFAULT 'default',
+    student_id TEXT,
+    flag_type TEXT,
+    domain TEXT,
+    created REAL NOT NULL,
+    has_screenshot INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS flags_by_student ON flags (student_id, id);
+CREATE INDEX IF NOT EXISTS flags_by_session ON flags (session, id);
+CREATE INDEX IF NOT EXISTS flags_by_type ON flags (flag_type, id);
+CREATE INDEX IF NOT EXISTS flags_by_time ON flags (created);
+CREATE TABLE IF NOT EXISTS screenshots (
+    flag_id INTEGER PRIMARY KEY,
+    mimetype TEXT NOT NULL,
+    etag TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+'''
+
+DEFAULT_SESSION = 'default'
+
+
+def session_of(flag):
+    return flag.get('session') or DEFAULT_SESSION
+
+
+class FlagStore:
+    def __init__(self, path, screenshot_url='/flags/{id}/screenshot', batch_size=200, flush_interval=0.25,
+                 shared=False, blobs=None):
+        self.path = path
+        self.shared = shared
+        self.blobs = blobs
+        self.screenshot_url = screenshot_url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.batches = 0
+        self.write_errors = 0
+        self._local = threading.local()
+        self._pending = []  # [(flag dict, (image, mimetype, etag) or None)], id order
+        self._cond = threading.Condition()
+        self._closed = False
+
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        self._next_id = (conn.execute('SELECT MAX(id) FROM flags').fetchone()[0] or 0) + 1
+        self._totals = {}  # {session: [flags, {studentId}, {domain}]}
+        for session, total in conn.execute('SELECT session, COUNT(*) FROM flags GROUP BY session'):
+            self._session_totals(session)[0] = total
+        for session, student_id, domain in conn.execute('SELECT DISTINCT session, student_id, domain FROM flags'):
+            totals = self._session_totals(session)
+            totals[1].add(student_id)
+            totals[2].add(domain)
+
+        self._writer = None
+        if not shared:
+            self._writer = threading.Thread(target=self._write_loop, name='flag-writer', daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
+
+    def _connection(self):
+        # One connection per thread; WAL lets readers run alongside the writer
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    # --- Writes ---
+
+    def append(self, flag, screenshot=None):
+        """Assign the next id to `flag`, queue it and return the id.
+
+        `screenshot` is an optional (image bytes, mimetype, etag) tuple; the
+        flag's `screenshot` field becomes the URL it can be fetched from.
+        """
+        if screenshot is not None and self.blobs is not None:
+            # Only the hash is queued; the bytes are shared with every identical image
+            image, mimetype, _ = screenshot
+            screenshot = (None, mimetype, self.blobs.put(image, mimetype))
+        if self.shared:
+            return self._append_now(flag, screenshot)
+        with self._cond:
+            flag_id = self._next_id
+            self._assign_id(flag, flag_id, screenshot)
+            self._next_id += 1
+            self._pending.append((flag, screenshot))
+            if len(self._pending) in (1, self.batch_size):
+                self._cond.notify_all()
+        return flag_id
+
+    def _assign_id(self, flag, flag_id, screenshot):
+        flag['id'] = flag_id
+        if screenshot is None:
+            flag['screenshot'] = None
+        elif screenshot[0] is None:
+            flag['screenshot'] = self.blobs.url(screenshot[2])
+        else:
+            flag['screenshot'] = self.screenshot_url.format(id=flag_id)
+        totals = self._session_totals(session_of(flag))
+        totals[0] += 1
+        totals[1].add(flag.get('studentId'))
+        totals[2].add(flag.get('domain'))
+
+    def _session_totals(self, session):
+        return self._totals.setdefault(session, [0, set(), set()])
+
+    def _append_now(self, flag, screenshot):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            flag_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM flags').fetchone()[0]
+            self._assign_id(flag, flag_id, screenshot)
+            self._insert(conn, [(flag, screenshot)])
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self._persist_blobs([(flag, screenshot)])
+        self.written += 1
+        return flag_id
+
+    def _write_loop(self):
+        conn = self._connection()
+        retries = 0
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if len(self._pending) < self.batch_size and not self._closed:
+                    # Give a burst (e.g. a TAB_SWITCH storm) a moment to fill the batch
+                    self._cond.wait(self.flush_interval)
+                batch = self._pending[:self.batch_size]
+                if not batch and self._closed:
+                    return
+            if not batch:
+                continue
+            try:
+                self._write(conn, batch)
+            except (sqlite3.Error, OSError) as e:
+                # The batch stays queued (and readable); try again, backing off up to 30 s
+                self.write_errors += 1
+                retry_in = min(0.5 * 2 ** retries, 30)
+                retries += 1
+                print(f"⚠️  Flag write failed ({e}), retrying in {retry_in:g}s")
+                deadline = time.time() + retry_in
+                with self._cond:
+                    while not self._closed and time.time() < deadline:
+                        self._cond.wait(deadline - time.time())
+                continue
+            retries = 0
+            with self._cond:
+                del self._pending[:len(batch)]
+                self._cond.notify_all()
+
+    def _write(self, conn, batch):
+        with conn:
+            self._insert(conn, batch)
+        self._persist_blobs(batch)
+        self.written += len(batch)
+        self.batches += 1
+
+    def _insert(self, conn, batch):
+        now = time.time()
+        conn.executemany(
+            'INSERT INTO flags (id, session, student_id, flag_type, domain, created, has_screenshot, data) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [(
+                flag['id'],
+                session_of(flag),
+                flag.get('studentId'),
+                flag.get('flagType'),
+                flag.get('domain'),
+                now,
+                int(screenshot is not None),
+                json.dumps(flag)
+            ) for flag, screenshot in batch]
+        )
+        screenshots = [(flag['id'], screenshot) for flag, screenshot in batch if screenshot is not None]
+        # Blob-backed rows keep an empty `data`: the etag is the blob's hash
+        conn.executemany(
+            'INSERT INTO screenshots (flag_id, mimetype, etag, data) VALUES (?, ?, ?, ?)',
+            [(flag_id, mimetype, etag, image or b'') for flag_id, (image, mimetype, etag) in screenshots]
+        )
+
+    def _persist_blobs(self, batch):
+        """Make committed flags' blob screenshots durable; the blob store drops append()'s reference after."""
+        for _, screenshot in batch:
+            if screenshot is not None and screenshot[0] is None:
+                self.blobs.persist_later(screenshot[2])
+
+    def flush(self, timeout=10):
+        """Block until everything appended so far is on disk."""
+        deadline = time.time() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._pending and time.time() < deadline:
+                self._cond.wait(deadline - time.time())
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._writer is not None:
+            self._writer.join(timeout=10)
+
+    # --- Reads ---
+
+    def since(self, since_id, limit, session=DEFAULT_SESSION):
+        """A session's flags with id > since_id, oldest first, at most `limit`."""
+        with self._cond:
+            pending = [flag for flag, _ in self._pending
+                       if flag['id'] > since_id and session_of(flag) == session][:limit]
+        rows = self._connection().execute(
+            'SELECT data FROM flags WHERE session = ? AND id > ? ORDER BY id LIMIT ?', (session, since_id, limit)
+        ).fetchall()
+        merged = {flag['id']: flag for flag in map(json.loads, (row[0] for row in rows))}
+        merged.update((flag['id'], flag) for flag in pending)
+        return [merged[flag_id] for flag_id in sorted(merged)][:limit]
+
+    def page(self, before=None, limit=50, session=DEFAULT_SESSION):
+        """A session's flags with id < before (all, if None), newest first, at most `limit`."""
+        if before is None:
+            before = 2 ** 63 - 1  # past any id
+        with self._cond:
+            pending = [flag for flag, _ in self._pending
+                       if flag['id'] < before and session_of(flag) == session][-limit:]
+        rows = self._connection().execute(
+            'SELECT data FROM flags WHERE session = ? AND id < ? ORDER BY id DESC LIMIT ?', (session, before, limit)
+        ).fetchall()
+        merged = {flag['id']: flag for flag in map(json.loads, (row[0] for row in rows))}
+        merged.update((flag['id'], flag) for flag in pending)
+        return [merged[flag_id] for flag_id in sorted(merged, reverse=True)][:limit]
+
+    def all(self, session=DEFAULT_SESSION):
+        """Every flag of a session, newest first."""
+        self.flush()
+        rows = self._connection().execute(
+            'SELECT data FROM flags WHERE session = ? ORDER BY id DESC', (session,)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def screenshot(self, flag_id):
+        """(image bytes, mimetype, etag) for a flag, or None."""
+        with self._cond:
+            screenshot = next((shot for flag, shot in self._pending if flag['id'] == flag_id), False)
+        if screenshot is False:
+            row = self._connection().execute(
+                'SELECT data, mimetype, etag FROM screenshots WHERE flag_id = ?', (flag_id,)
+            ).fetchone()
+            screenshot = (bytes(row[0]) or None, row[1], row[2]) if row else None
+        if screenshot is None or screenshot[0] is not None:
+            return screenshot
+        blob = self.blobs.get(screenshot[2]) if self.blobs is not None else None
+        return (blob[0], blob[1], screenshot[2]) if blob else None
+
+    def counts(self, session=DEFAULT_SESSION):
+        """Totals for a session's dashboard header: flags, distinct students, distinct domains."""
+        if self.shared:
+            # Other workers append too, so only the database has the real totals
+            total, students, domains = self._connection().execute(
+                'SELECT COUNT(*), COUNT(DISTINCT student_id), COUNT(DISTINCT domain) FROM flags WHERE session = ?',
+                (session,)
+            ).fetchone()
+            return {'flags': total, 'students': students, 'domains': domains}
+        with self._cond:
+            total, students, domains = self._totals.get(session, (0, set(), set()))
+            return {
+                'flags': total,
+                'students': len(students - {None}),
+                'domains': len(domains - {None}),
+            }
+
+    def stats(self):
+        with self._cond:
+            pending = len(self._pending)
+        return {'pending': pending, 'written': self.written, 'batches': self.batches, 'write_errors': self.write_errors}
@@ -0,0 +1,287 @@
+"""Append-only, time-indexed recording of every stored live frame.
+
+live_frames only points at each student's latest frame. The archive keeps the
+history, so after a flag the professor can look at what the screen showed
+just before it.
+
+Layout, one directory per session and student:
+
+    <root>/<session>/<student>/seg-<start ms>-<pid>.bin   frames, back to back
+    <root>/<session>/<student>/seg-<start ms>-<pid>.idx   one record per frame:
+                                                          timestamp, offset, length
+
+A segment is closed at `segment_bytes`, and each worker process writes its
+own segments, so several workers can record into one directory. Readers
+merge every .idx file of a student into one timestamp-sorted list and find
+a time with bisect. The merged list is cached (for the `index_cache_size`
+most recently read students) with how far each .idx file was read, so a
+student who is still recording only costs reading the new records.
+
+append() only queues the frame. A background thread does the writing, so
+ingest latency doesn't depend on the disk. When the queue is full, frames
+are dropped and counted. Retention deletes the oldest segments once the
+archive is over `max_bytes`, or once segments are older than `max_age`
+seconds.
+
+Each frame's bytes are a contiguous range of its segment, so playback can
+use HTTP Range requests against the segment file. Frames are stored as
+uploaded (JPEG, or PNG from older extension builds); image_mimetype()
+tells them apart.
+"""
+import bisect
+import glob
+import os
+import queue
+import re
+import struct
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+
+RECORD = struct.Struct('<dQI')  # timestamp (epoch s), offset, length
+SEGMENT_NAME = re.compile(r'^seg-\d+-\d+$')
+RETENTION_EVERY = 60.0  # seconds between retention sweeps
+
+
+def image_mimetype(frame):
+    """The type of an archived frame, from its magic bytes."""
+    if frame.startswith(b'\x89PNG'):
+        return 'image/png'
+    if frame[:4] == b'RIFF' and frame[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/jpeg'
+
+
+def safe_name(value):
+    """A path component for any student or session id (no separators, no dot-dirs)."""
+    return quote(str(value), safe='').replace('.', '%2E') or '%00'
+
+
+class FrameArchive:
+    def __init__(self, root, segment_bytes=16 << 20, max_bytes=2 << 30, max_age=None, queue_size=1000,
+                 index_cache_size=256):
+        self.root = os.path.abspath(root)
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.written = 0
+        self.dropped = 0
+        self.deleted_segments = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._open = {}   # {(session, student): [segment name, data file, index file, size]}
+        self.index_cache_size = index_cache_size
+        self._index_cache = OrderedDict()  # {directory: ({.idx path: bytes read}, times, entries)}, LRU last
+        self._index_lock = threading.RLock()  # the cached lists grow in place: read them under it
+        self._last_sweep = 0.0
+        os.makedirs(root, exist_ok=True)
+        self._writer = threading.Thread(target=self._write_loop, name='frame-archive', daemon=True)
+        self._writer.start()
+
+    # --- Writes ---
+
+    def append(self, student_id, timestamp, image, session='default'):
+        """Queue one frame for recording; never blocks."""
+        try:
+            self._queue.put_nowait((session, student_id, timestamp, image))
+        except queue.Full:
+            self.dropped += 1
+
+    def close_student(self, student_id, session='default'):
+        """Queue closing a student's open segment, once they've left."""
+        try:
+            self._queue.put_nowait((session, student_id, None, None))
+        except queue.Full:
+            pass  # closed when the segment fills up, or never: one file handle
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            touched = set()
+            for session, student_id, timestamp, image in batch:
+                key = (session, student_id)
+                try:
+                    if image is None:
+                        touched.discard(key)
+                        if key in self._open:
+                            self._close(key)
+                    else:
+                        touched.add(self._write(session, student_id, timestamp, image))
+                except OSError as e:
+                    print(f"⚠️  Frame archive write failed: {e}")
+            for key in touched:
+                segment = self._open.get(key)
+                if segment is None:
+                    continue  # its next segment failed to open
+                try:
+                    # Data before index, so a reader never sees a record past the end of the data
+                    segment[1].flush()
+                    segment[2].flush()
+                except OSError as e:
+                    print(f"⚠️  Frame archive flush failed: {e}")
+                    self._abandon(key)
+            if time.time() - self._last_sweep > RETENTION_EVERY:
+                self._last_sweep = time.time()
+                try:
+                    self.enforce_retention()
+                except OSError as e:
+                    print(f"⚠️  Frame archive retention sweep failed: {e}")
+
+    def _write(self, session, student_id, timestamp, image):
+        key = (session, student_id)
+        segment = self._open.get(key)
+        if segment is not None and segment[3] >= self.segment_bytes:
+            self._close(key)
+            segment = None
+        if segment is None:
+            directory = self._directory(session, student_id)
+            os.makedirs(directory, exist_ok=True)
+            name = f'seg-{int(timestamp * 1000)}-{os.getpid()}'
+            base = os.path.join(directory, name)
+            segment = self._open[key] = [name, open(base + '.bin', 'ab'), open(base + '.idx', 'ab'), 0]
+            segment[3] = segment[1].tell()
+        name, data, index, size = segment
+        data.write(image)
+        index.write(RECORD.pack(timestamp, size, len(image)))
+        segment[3] = size + len(image)
+        self.written += 1
+        return key
+
+    def _close(self, key):
+        _, data, index, _ = self._open.pop(key)
+        try:
+            data.close()
+        finally:
+            index.close()
+
+    def _abandon(self, key):
+        """Drop a segment that failed to flush; the student's next frame starts a new one."""
+        try:
+            self._close(key)
+        except OSError:
+            pass
+
+    def _directory(self, session, student_id):
+        return os.path.join(self.root, safe_name(session), safe_name(student_id))
+
+    def enforce_retention(self):
+        """Delete the oldest closed segments until under max_bytes and max_age."""
+        open_segments = {segment[0] for segment in self._open.values()}
+        segments = []
+        for data_path in glob.glob(os.path.join(self.root, '*', '*', 'seg-*.bin')):
+            name = os.path.basename(data_path)[:-4]
+            try:
+                stat = os.stat(data_path)
+            except FileNotFoundError:
+                continue
+            segments.append((stat.st_mtime, stat.st_size, name, data_path))
+        segments.sort()
+        total = sum(size for _, size, _, _ in segments)
+        cutoff = time.time() - self.max_age if self.max_age else None
+        for mtime, size, name, data_path in segments:
+            expired = cutoff is not None and mtime < cutoff
+            if total <= self.max_bytes and not expired:
+                break
+            if name in open_segments:
+                continue
+            for path in (data_path, data_path[:-4] + '.idx'):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            self.deleted_segments += 1
+
+    # --- Reads ---
+
+    def _entries(self, student_id, session):
+        """(times, [(timestamp, segment, offset, length)]) for a student, oldest first."""
+        directory = self._directory(session, student_id)
+        sizes = {}
+        for path in glob.glob(os.path.join(directory, 'seg-*.idx')):
+            try:
+                sizes[path] = os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+        with self._index_lock:
+            cached = self._index_cache.pop(directory, None)
+            if cached is None or not cached[0].keys() <= sizes.keys():
+                cached = ({}, [], [])  # new, or retention removed a segment: start over
+            read, times, entries = cached
+            for path, size in sizes.items():
+                end = size - size % RECORD.size
+                if end > read.get(path, 0):
+                    self._read_index(path, read, end, times, entries)
+            self._index_cache[directory] = cached
+            while len(self._index_cache) > self.index_cache_size:
+                self._index_cache.popitem(last=False)
+            return times, entries
+
+    @staticmethod
+    def _read_index(path, read, end, times, entries):
+        """Add the records of one .idx file from where it was last read up to `end` (index lock held)."""
+        start = read.get(path, 0)
+        try:
+            with open(path, 'rb') as f:
+                f.seek(start)
+                raw = f.read(end - start)
+        except FileNotFoundError:
+            return
+        read[path] = start + len(raw) - len(raw) % RECORD.size
+        segment = os.path.basename(path)[:-4]
+        for timestamp, offset, length in RECORD.iter_unpack(raw[:len(raw) - len(raw) % RECORD.size]):
+            entry = (timestamp, segment, offset, length)
+            if not entries or entry >= entries[-1]:
+                entries.append(entry)  # the usual case: the newest frame so far
+                times.append(timestamp)
+            else:
+                i = bisect.bisect(entries, entry)
+                entries.insert(i, entry)
+                times.insert(i, timestamp)
+
+    def seek(self, student_id, timestamp, session='default'):
+        """The last frame at or before `timestamp`, as (timestamp, segment, offset, length), or None."""
+        with self._index_lock:
+            times, entries = self._entries(student_id, session)
+            i = bisect.bisect_right(times, timestamp)
+            return entries[i - 1] if i else None
+
+    def frames(self, student_id, start=None, end=None, session='default', limit=5000):
+        """Index entries with start <= timestamp <= end, oldest first."""
+        with self._index_lock:
+            times, entries = self._entries(student_id, session)
+            lo = bisect.bisect_left(times, start) if start is not None else 0
+            hi = bisect.bisect_right(times, end) if end is not None else len(times)
+            return entries[lo:min(hi, lo + limit)]
+
+    def segment_path(self, student_id, segment, session='default'):
+        """Path of a segment's data file, or None for an unknown or malformed name."""
+        if not SEGMENT_NAME.match(segment):
+            return None
+        path = os.path.join(self._directory(session, student_id), segment + '.bin')
+        return path if os.path.exists(path) else None
+
+    def read(self, student_id, entry, session='default'):
+        """A frame's bytes, or None if retention removed its segment."""
+        _, segment, offset, length = entry
+        path = self.segment_path(student_id, segment, session)
+        try:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                return f.read(length)
+        except (TypeError, FileNotFoundError):
+            return None
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'open_segments': len(self._open),
+            'deleted_segments': self.deleted_segments,
+        }
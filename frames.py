@@ -0,0 +1,59 @@
+"""Image helpers for live frames: change fingerprints and scaled variants.
+
+A fingerprint is the frame shrunk to a 32x32 grayscale thumbnail (1 KB).
+JPEG draft mode lets the decoder scale down while decoding, so this costs
+about a millisecond for a 960px frame. Two frames count as the same when
+no cell of the thumbnail moved by more than a few gray levels. That
+ignores JPEG re-encoding noise but still catches a line of new text or a
+window switch.
+
+scaled() re-encodes a frame at a smaller width for the grid tiles, which
+draw at a few hundred pixels and don't need the full 960px frame.
+
+Pillow is optional: without it, fingerprint() and scaled() return None.
+Callers then compare the frames' exact bytes and serve the original frame.
+"""
+from io import BytesIO
+
+try:
+    from PIL import Image
+except ImportError:  # exact-match diffing, original-size frames only
+    Image = None
+
+FINGERPRINT_SIZE = (32, 32)
+
+
+def fingerprint(image):
+    """1024-byte grayscale thumbnail of an encoded image, or None."""
+    if Image is None or not image:
+        return None
+    try:
+        with Image.open(BytesIO(image)) as img:
+            img.draft('L', (FINGERPRINT_SIZE[0] * 4, FINGERPRINT_SIZE[1] * 4))
+            return img.convert('L').resize(FINGERPRINT_SIZE, Image.BILINEAR).tobytes()
+    except Exception:
+        return None
+
+
+def max_difference(a, b):
+    """Largest per-cell gray-level change between two fingerprints (0-255)."""
+    if not a or not b or len(a) != len(b):
+        return 255
+    return max(abs(x - y) for x, y in zip(a, b))
+
+
+def scaled(image, width, quality=45):
+    """JPEG of `image` scaled down to `width` pixels wide, or None if it's already that small."""
+    if Image is None or not image:
+        return None
+    try:
+        with Image.open(BytesIO(image)) as img:
+            if img.width <= width:
+                return None
+            height = max(1, round(img.height * width / img.width))
+            img.draft('RGB', (width, height))
+            out = BytesIO()
+            img.convert('RGB').resize((width, height), Image.BILINEAR).save(out, 'JPEG', quality=quality)
+            return out.getvalue()
+    except Exception:
+        return None
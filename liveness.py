@@ -0,0 +1,134 @@
+"""Which students are still there: online, stale or gone.
+
+Every request from a student calls seen(). A sweeper thread, sleeping until
+the next deadline in a heap with one entry per student, moves them along
+
+    online --(no request for stale_after s)--> stale --(gone_after s)--> gone
+
+and reports each change to `on_change(student_id, status)`. `last_seen` can be
+a shared map (state.py); each worker sweeps only the students it has seen.
+"""
+import heapq
+import threading
+import time
+
+ONLINE = 'online'
+STALE = 'stale'
+GONE = 'gone'
+
+
+class LivenessTracker:
+    def __init__(self, stale_after, gone_after, on_change, last_seen=None):
+        self.stale_after = stale_after
+        self.gone_after = gone_after
+        self.on_change = on_change
+        self.last_seen = {} if last_seen is None else last_seen  # {studentId: epoch seconds}
+        self.expired = 0
+        self._status = {}     # {studentId: ONLINE | STALE}
+        self._scheduled = {}  # {studentId: due time of its heap entry}
+        self._heap = []       # [(due time, studentId)]
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._sweeper = threading.Thread(target=self._sweep_loop, name='liveness', daemon=True)
+        self._sweeper.start()
+
+    def seen(self, student_id):
+        """Record activity; reports `online` if the student wasn't."""
+        now = time.time()
+        self.last_seen[student_id] = now
+        with self._cond:
+            previous = self._status.get(student_id)
+            self._status[student_id] = ONLINE
+            if student_id not in self._scheduled:
+                self._schedule(student_id, now + self.stale_after)
+        if previous != ONLINE:
+            self.on_change(student_id, ONLINE)
+
+    def leave(self, student_id):
+        """The student said goodbye (stopped sharing, closed the tab): gone now."""
+        with self._cond:
+            known = self._status.pop(student_id, None) is not None
+            self._scheduled.pop(student_id, None)  # its heap entry is skipped when it comes due
+        self.last_seen.pop(student_id, None)
+        if known:
+            self.expired += 1
+            self.on_change(student_id, GONE)
+
+    def status(self, student_id):
+        with self._cond:
+            return self._status.get(student_id)
+
+    def snapshot(self):
+        """{studentId: status} for every student not yet gone."""
+        with self._cond:
+            return dict(self._status)
+
+    def stop(self):
+        """End the sweeper thread; no changes are reported after this."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def _schedule(self, student_id, due):
+        """Push the student's one heap entry (lock held)."""
+        self._scheduled[student_id] = due
+        heapq.heappush(self._heap, (due, student_id))
+        if self._heap[0][1] == student_id:
+            self._cond.notify()  # new earliest deadline
+
+    def _sweep_loop(self):
+        while True:
+            changes = []
+            with self._cond:
+                while not self._stopped and (not self._heap or self._heap[0][0] > time.time()):
+                    self._cond.wait(self._heap[0][0] - time.time() if self._heap else None)
+                if self._stopped:
+                    return
+                now = time.time()
+                while self._heap and self._heap[0][0] <= now:
+                    due, student_id = heapq.heappop(self._heap)
+                    if self._scheduled.get(student_id) != due:
+                        continue  # left, or superseded by a later entry
+                    del self._scheduled[student_id]
+                    change = self._expire(student_id, now)
+                    if change:
+                        changes.append((student_id, change))
+            for student_id, status in changes:
+                try:
+                    self.on_change(student_id, status)
+                except Exception as e:
+                    print(f"⚠️  Liveness change for {student_id} failed: {e}")
+
+    def _expire(self, student_id, now):
+        """Advance one student whose deadline passed; the new status, or None (lock held)."""
+        last = self.last_seen.get(student_id) or 0
+        idle = now - last
+        status = self._status.get(student_id)
+        if idle < self.stale_after:
+            # Seen since this entry was pushed: wait for the new deadline
+            self._schedule(student_id, last + self.stale_after)
+            if status != ONLINE:
+                self._status[student_id] = ONLINE
+                return ONLINE  # seen on another worker
+            return None
+        if idle < self.gone_after:
+            self._schedule(student_id, last + self.gone_after)
+            if status != STALE:
+                self._status[student_id] = STALE
+                return STALE
+            return None
+        self._status.pop(student_id, None)
+        self.last_seen.pop(student_id, None)
+        self.expired += 1
+        return GONE
+
+    def stats(self):
+        with self._cond:
+            statuses = list(self._status.values())
+            scheduled = len(self._heap)
+        return {
+            'online': statuses.count(ONLINE),
+            'stale': statuses.count(STALE),
+            'scheduled': scheduled,
+            'expired': self.expired,
+        }
@@ -1,156 +1,1022 @@
-from flask import Flask, request, jsonify, render_template_string, Response, send_from_directory
+from flask import Flask, request, jsonify, render_template, stream_template, Response, send_file, abort, make_response
 from flask_cors import CORS
 from datetime import datetime
 import base64
 import json
+import os
 import time
-import queue
 import threading
+from urllib.parse import quote
+
+from blob_store import BlobStore, blob_hash
+from capture_rate import CaptureRateController
+from compression import MIN_SIZE, CompressionStats, StreamCompressor, compress, negotiate
+from exam_sessions import DEFAULT as DEFAULT_SESSION, NAME_PATTERN as SESSION_NAME, ExamSession, ExamSessions
+from flag_store import FlagStore
+from frame_archive import FrameArchive, image_mimetype
+from frames import fingerprint, max_difference, scaled
+from liveness import GONE
+from sse import HEARTBEAT
+from state import backend_from_url
+from static_assets import IMMUTABLE, AssetStore
 
 app = Flask(__name__)
 CORS(app)
 
-# Store flags in memory (use database later)
-flags = []
-
-# Store live screenshots for each student
-live_screens = {}  # {studentId: {screenshot, url, timestamp}}
-
-# SSE: list of per-client queues so multiple viewers all get events
-sse_clients = []
-sse_clients_lock = threading.Lock()
-
-# WebRTC signaling store
-webrtc_offers = {}   # {studentId: complete offer SDP}
-webrtc_answers = {}  # {studentId: complete answer SDP}
-
-def broadcast(message):
-    """Send an event to every connected SSE client."""
-    with sse_clients_lock:
-        dead = []
-        for q in sse_clients:
-            try:
-                q.put_nowait(message)
-            except Exception:
-                dead.append(q)
-        for q in dead:
-            sse_clients.remove(q)
-
-@app.route('/flag', methods=['POST'])
-def receive_flag():
-    data = request.json
-    data['received_at'] = datetime.now().strftime('%Y-%m-%d %I:%M:%S %p')
-    flags.append(data)
-    print(f"🚨 FLAG: Student {data['studentId']} accessed {data['domain']} at {data['received_at']}")
+# Live state and events go through a backend so several workers can share
+# them: in-process by default, Redis when STATE_BACKEND_URL is set
+state = backend_from_url(os.environ.get('STATE_BACKEND_URL'))
+
+# Screenshots are stored once per distinct image and referenced by hash (see blob_store.py)
+blobs = BlobStore(
+    os.environ.get('BLOB_DIR', 'blobs'),
+    memory_bytes=int(os.environ.get('BLOB_MEMORY_MB', 64)) << 20,
+    shared=state.shared_blobs('blobs')
+)
+
+# Flags persist in SQLite; ids are monotonic so viewers can page with ?since=
+flags = FlagStore(os.environ.get('FLAG_DB_PATH', 'flags.db'), shared=state.shared, blobs=blobs)
+
+# Smaller copies of each frame: grid tiles get `thumb` (made at ingest), the
+# `preview` size is made on first request. The modal fetches the original.
+FRAME_SIZES = {'thumb': 320, 'preview': 640}
+
+# Frames that barely differ from the last stored one are acknowledged but
+# neither stored nor broadcast, and the student is told to capture less often
+FRAME_CHANGE_THRESHOLD = int(os.environ.get('FRAME_CHANGE_THRESHOLD', 6))  # gray levels, 0-255
+ingest_stats = {'frames_stored': 0, 'frames_unchanged': 0}  # this worker only
+
+# History of stored frames, for looking back from a flag (see frame_archive.py)
+archive = FrameArchive(
+    os.environ.get('FRAME_ARCHIVE_DIR', 'frame-archive'),
+    max_bytes=int(os.environ.get('FRAME_ARCHIVE_MAX_MB', 2048)) << 20,
+    max_age=float(os.environ.get('FRAME_ARCHIVE_MAX_HOURS', 0)) * 3600 or None
+)
+
+# --- Exam sessions ---
+
+# Each exam's live state, SSE viewers and liveness are its own (see
+# exam_sessions.py). Every route below is also served under /s/<session>/;
+# without the prefix it is session `default`.
+def open_exam(name):
+    return ExamSession(
+        name, state, FRAME_SIZES, student_status_changed,
+        # SSE: one bounded buffer per viewer; slow viewers get coalesced, then evicted
+        hub_options={
+            'maxlen': int(os.environ.get('SSE_CLIENT_BUFFER', 256)),
+            'evict_after': float(os.environ.get('SSE_EVICT_AFTER', 30)),
+            'replay': int(os.environ.get('SSE_REPLAY_EVENTS', 1024))
+        },
+        # No request for STUDENT_STALE_SECONDS: stale; for STUDENT_TTL_SECONDS: gone.
+        # Capture intervals top out at 15 s, so a sharing student is never stale.
+        liveness_options={
+            'stale_after': float(os.environ.get('STUDENT_STALE_SECONDS', 45)),
+            'gone_after': float(os.environ.get('STUDENT_TTL_SECONDS', 300))
+        },
+        max_students=int(os.environ.get('SESSION_MAX_STUDENTS', 500)),
+        max_viewers=int(os.environ.get('SESSION_MAX_VIEWERS', 100))
+    )
 
-    # Push to all SSE clients for real-time updates
-    broadcast({
+# Students' ingest (or POST /sessions/<name>) opens a session; one without
+# students or viewers for SESSION_IDLE_SECONDS is closed
+exams = ExamSessions(
+    open_exam,
+    max_sessions=int(os.environ.get('MAX_EXAM_SESSIONS', 100)),
+    registry=state.map('exam_sessions'),
+    idle_after=float(os.environ.get('SESSION_IDLE_SECONDS', 600))
+)
+
+def exam_route(rule, **options):
+    """@app.route for `rule` and `/s/<session>` + rule; the view gets `session` either way."""
+    def decorator(view):
+        app.add_url_rule(rule, defaults={'session': DEFAULT_SESSION}, view_func=view, **options)
+        app.add_url_rule('/s/<session>' + rule.rstrip('/'), view_func=view, **options)
+        return view
+    return decorator
+
+def get_exam(name, create=False):
+    """The ExamSession for a route's `session`; aborts with 404 (bad name, not open) or 429 (too many sessions).
+
+    Only routes students send to pass `create`.
+    """
+    exam = exams.get(name, create)
+    if exam is None:
+        if create and SESSION_NAME.match(name):
+            abort(make_response(jsonify({'error': 'too many exam sessions'}), 429))
+        abort(make_response(jsonify({'error': 'no such exam session'}), 404))
+    return exam
+
+def too_many_viewers():
+    return jsonify({'error': 'this exam session has too many viewers'}), 429
+
+def broadcast(exam, message):
+    """Send an event to every SSE client of one exam session, on every worker."""
+    # One id sequence per session for all workers, so Last-Event-ID means the same on any of them.
+    # The id is taken and published in one step, so no viewer gets a lower id after a higher one.
+    state.publish_numbered(exam.key('sse_event_id'), {'session': exam.name, 'event': message})
+
+def deliver(envelope):
+    """Hand a published event to this worker's viewers of its session."""
+    if 'event' not in envelope:
+        return  # worker-to-worker notice (see signal_posted)
+    name = envelope.get('session', DEFAULT_SESSION)
+    if name not in exams:
+        return  # nobody here has that session open
+    exam = exams.get(name)
+    message = envelope['event']
+    # Only the newest screen per student matters to a viewer that's behind
+    key = None
+    if message.get('type') in ('live_screen_update', 'student_status'):
+        key = (message['type'], message.get('studentId'))
+    exam.hub.publish(message, key, event_id=envelope['id'])
+
+state.subscribe(deliver)
+
+# Every /live-update reply carries the student's next capture interval and
+# quality. The ingest budget is the server's, shared by every session, so
+# students are keyed by (session, studentId). Whether anyone is watching,
+# and how backed up their buffers are, is per session.
+capture_rate = CaptureRateController(
+    budget_fps=float(os.environ.get('INGEST_BUDGET_FPS', 100)),
+    viewer_count=lambda session: len(exams.get(session).hub) if session in exams else 0,
+    queue_pressure=lambda session: exams.get(session).hub.pressure() if session in exams else 0.0,
+    rtc_live=lambda key: key[0] in exams and rtc_live(exams.get(key[0]), key[1]),  # defined with the signaling routes
+    session_of=lambda key: key[0]
+)
+
+def capture_key(exam, student_id):
+    return (exam.name, student_id)
+
+# --- Student liveness ---
+
+def student_status_changed(exam, student_id, status):
+    """Tell viewers a student went online/stale/gone; a gone student's state is dropped."""
+    if status == GONE:
+        evict_student(exam, student_id)
+    broadcast(exam, {'type': 'student_status', 'studentId': student_id, 'status': status})
+
+def evict_student(exam, student_id):
+    """Forget a student's live frame, its variants and their WebRTC SDPs (the archive keeps history)."""
+    screen = exam.live_screens.pop(student_id, None)
+    if screen and screen.get('etag'):
+        blobs.release(screen['etag'])
+    exam.live_frames.pop(student_id, None)
+    for variants in exam.frame_variants.values():
+        variants.pop(student_id, None)
+    exam.frame_fingerprints.pop(student_id, None)
+    drop_sessions(exam, student_id)
+    for size in (None, *FRAME_SIZES):
+        exam.frame_packets.pop((student_id, size), None)
+    exam.mjpeg_parts.pop(student_id, None)
+    archive.close_student(student_id, exam.name)
+    print(f"👋 Student {student_id} gone from {exam.name}, live state evicted")
+
+# The unprefixed routes' session always exists
+exams.get(DEFAULT_SESSION, create=True)
+
+# --- Response compression ---
+
+compression_stats = CompressionStats()
+SSE_COMPRESSION = os.environ.get('SSE_COMPRESSION', '1') != '0'
+
+@app.after_request
+def compress_json(response):
+    """zstd/gzip for JSON API responses big enough to benefit"""
+    if (response.mimetype != 'application/json' or response.status_code != 200
+            or response.direct_passthrough or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    coding = negotiate(request.headers.get('Accept-Encoding'))
+    body = response.get_data()
+    if coding is None or len(body) < MIN_SIZE:
+        return response
+    response.set_data(compression_stats.timed(request.endpoint, lambda data: compress(data, coding), body))
+    response.headers['Content-Encoding'] = coding
+    etag, _ = response.get_etag()
+    if etag:
+        # Same JSON, different bytes: only a weak validator still holds
+        response.set_etag(etag, weak=True)
+    return response
+
+def parse_data_url(data_url):
+    """Split a `data:<mime>;base64,<payload>` URL into (bytes, mimetype)."""
+    if not data_url or not data_url.startswith('data:'):
+        return None, None
+    header, _, payload = data_url.partition(',')
+    mimetype = header[5:].split(';')[0] or 'application/octet-stream'
+    try:
+        return base64.b64decode(payload), mimetype
+    except (ValueError, TypeError):
+        return None, None
+
+def frame_etag(image):
+    """Strong ETag for a frame: its blob hash, so a flag showing the same image shares its blob."""
+    return blob_hash(image)
+
+def live_frame(exam, student_id):
+    """(image bytes, mimetype, etag) of a student's latest frame, or None. The bytes are in the blob store."""
+    etag = exam.live_frames.get(student_id)
+    blob = blobs.get(etag) if etag else None
+    return (blob[0], blob[1], etag) if blob else None
+
+def parse_screenshot_body(content_type, body, args):
+    """(metadata, image bytes, mimetype) from a raw-image or JSON upload body.
+
+    Raw bodies (image/jpeg, image/png, application/octet-stream) carry the
+    metadata in the query string -- this is what the join page sends, and it
+    works with navigator.sendBeacon. JSON bodies are the legacy format with
+    a base64 data URL, still used by the extension and the demo page.
+    """
+    if content_type == 'application/json':
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+        image, mimetype = parse_data_url(data.pop('screenshot', None))
+        return data, image, mimetype
+    if content_type in ('', 'application/octet-stream'):
+        content_type = 'image/jpeg'
+    return dict(args), body or None, content_type
+
+def read_screenshot_upload():
+    """Pull (metadata, image bytes, mimetype) out of the current request.
+
+    Besides the bodies parse_screenshot_body understands, multipart uploads
+    with a `screenshot` file part and form fields are accepted here.
+    """
+    content_type = request.mimetype or ''
+    if content_type == 'multipart/form-data':
+        data = request.form.to_dict()
+        upload = request.files.get('screenshot')
+        if upload is None:
+            return data, None, None
+        return data, upload.read() or None, upload.mimetype or 'image/jpeg'
+    return parse_screenshot_body(content_type, request.get_data(cache=False), request.args.to_dict())
+
+def normalize_student_id(data):
+    """Make a JSON body's numeric `studentId` a string, like every other; False if it can't be one."""
+    student_id = data.get('studentId')
+    if student_id is None or isinstance(student_id, str):
+        return True
+    if isinstance(student_id, (int, float)) and not isinstance(student_id, bool):
+        data['studentId'] = str(student_id)
+        return True
+    return False
+
+def record_flag(exam, data, image, mimetype):
+    """Store a flag, announce it to the session's viewers and return (response body, status)."""
+    if not normalize_student_id(data):
+        return {'status': 'error', 'error': 'studentId must be a string'}, 400
+    if 'textLength' in data:
+        try:
+            data['textLength'] = int(data['textLength'])
+        except (TypeError, ValueError):
+            data['textLength'] = 0
+    data['received_at'] = datetime.now().strftime('%Y-%m-%d %I:%M:%S %p')
+    data['session'] = exam.name
+    if data.get('studentId'):
+        exam.liveness.seen(data['studentId'])
+        capture_rate.mark_flagged(capture_key(exam, data['studentId']))
+    flags.append(data, (image, mimetype, frame_etag(image)) if image else None)
+    print(f"🚨 FLAG: Student {data.get('studentId')} accessed {data.get('domain')} at {data['received_at']}")
+
+    # Push to the session's SSE clients for real-time updates
+    broadcast(exam, {
         'type': 'new_flag',
         'data': data
     })
 
-    return jsonify({'status': 'received'}), 200
+    return {'status': 'received'}, 200
 
-@app.route('/live-update', methods=['POST'])
-def receive_live_update():
-    """Receive live screenshot updates from students"""
-    data = request.json
+def record_live_update(exam, data, image, mimetype):
+    """Store a student's latest frame and return (response body, status)."""
+    if not normalize_student_id(data):
+        return {'status': 'error', 'error': 'studentId must be a string'}, 400
     student_id = data.get('studentId')
-
-    # Store latest screenshot for this student
-    live_screens[student_id] = {
-        'screenshot': data.get('screenshot'),
+    if not student_id:
+        return {'status': 'error', 'error': 'studentId is required'}, 400
+    if not exam.admits_student(student_id):
+        return {'status': 'error', 'error': 'this exam session is full'}, 429
+    exam.liveness.seen(student_id)
+    key = capture_key(exam, student_id)
+    capture_rate.frame_received(key)
+
+    # Store latest screenshot for this student. Viewers only get a versioned
+    # URL; the bytes are fetched from /screen/<id>.jpg when the version moves.
+    previous = exam.live_screens.get(student_id, {})
+    version = previous.get('version', 0)
+    etag = previous.get('etag')
+    if image:
+        new_etag = frame_etag(image)
+        new_fingerprint = fingerprint(image)
+        last = exam.frame_fingerprints.get(student_id)
+        if last and frame_unchanged(previous, data, new_etag, new_fingerprint, last):
+            unchanged = last['unchanged'] + 1
+            exam.frame_fingerprints[student_id] = {**last, 'unchanged': unchanged}
+            ingest_stats['frames_unchanged'] += 1
+            return {'status': 'unchanged', **capture_rate.advise(key, unchanged)}, 200
+        version += 1
+        # The current frame holds a blob reference, so a flag posted with the same image is free
+        blobs.put(image, mimetype)
+        if etag:
+            blobs.release(etag)
+        etag = new_etag
+        exam.live_frames[student_id] = etag
+        frame = (image, mimetype, etag)
+        frame_variant(exam, student_id, frame, 'thumb')
+        archive.append(student_id, time.time(), image, session=exam.name)
+        ingest_stats['frames_stored'] += 1
+        exam.frame_fingerprints[student_id] = {
+            'fingerprint': new_fingerprint.hex() if new_fingerprint else None,
+            'unchanged': 0
+        }
+    exam.live_screens[student_id] = screen = {
+        'screenshot': screen_url(exam, student_id, version, 'thumb') if etag else None,
+        'screenshotFull': screen_url(exam, student_id, version) if etag else None,
         'currentUrl': data.get('currentUrl'),
         'currentTitle': data.get('currentTitle'),
         'timestamp': data.get('timestamp'),
-        'lastUpdate': datetime.now().strftime('%Y-%m-%d %I:%M:%S %p')
+        'lastUpdate': datetime.now().strftime('%Y-%m-%d %I:%M:%S %p'),
+        'version': version,
+        'etag': etag
     }
 
-    # Push update to all SSE clients
-    broadcast({
+    # Push update to the session's SSE clients
+    broadcast(exam, {
         'type': 'live_screen_update',
         'studentId': student_id,
-        'data': live_screens[student_id]
+        'data': screen
     })
 
-    return jsonify({'status': 'received'}), 200
+    return {'status': 'received', **capture_rate.advise(key)}, 200
+
+def frame_unchanged(previous, data, etag, new_fingerprint, last):
+    """True when a frame shows nothing new compared with the stored one."""
+    if data.get('currentUrl') != previous.get('currentUrl'):
+        return False
+    if data.get('currentTitle') != previous.get('currentTitle'):
+        return False
+    if etag == previous.get('etag'):
+        return True
+    if new_fingerprint is None or not last.get('fingerprint'):
+        return False
+    # Compare against the last *stored* frame so slow drift still adds up
+    return max_difference(new_fingerprint, bytes.fromhex(last['fingerprint'])) <= FRAME_CHANGE_THRESHOLD
+
+@exam_route('/flag', methods=['POST'])
+def receive_flag(session):
+    body, status = record_flag(get_exam(session, create=True), *read_screenshot_upload())
+    return jsonify(body), status
+
+@exam_route('/live-update', methods=['POST'])
+def receive_live_update(session):
+    """Receive live screenshot updates from students"""
+    body, status = record_live_update(get_exam(session, create=True), *read_screenshot_upload())
+    return jsonify(body), status
+
+@exam_route('/leave', methods=['POST'])
+def leave(session):
+    """Student stopped sharing or closed the tab (a beacon): drop their live state now"""
+    student_id = request.args.get('studentId')
+    if not student_id:
+        return jsonify({'status': 'error', 'error': 'studentId is required'}), 400
+    get_exam(session).liveness.leave(student_id)
+    return jsonify({'status': 'ok'})
 
-@app.route('/live-screens')
-def get_live_screens():
-    """Get current live screens for all students"""
-    return jsonify(live_screens)
+def screen_url(exam, student_id, version, size=None):
+    url = f"{exam.url_prefix}/screen/{quote(student_id, safe='')}.jpg?v={version}"
+    return url + f'&size={size}' if size else url
+
+def frame_variant(exam, student_id, frame, size):
+    """`frame` scaled to one of FRAME_SIZES, cached per frame; the frame itself if it can't be."""
+    image, _, etag = frame
+    variant_etag = f'{etag}-{size}'
+    cached = exam.frame_variants[size].get(student_id)
+    if cached is not None and cached[2] == variant_etag:
+        return cached
+    smaller = scaled(image, FRAME_SIZES[size])
+    if smaller is None:
+        return frame
+    exam.frame_variants[size][student_id] = variant = (smaller, 'image/jpeg', variant_etag)
+    return variant
+
+# Frames for WebSocket viewers (asgi.py): a u16 header length, a JSON header, then the JPEG.
+# Built once per frame and size, then the same bytes go to every socket
+# (kept in the session's frame_packets).
+
+def cached_frame_packet(exam, student_id, size, etag):
+    cached = exam.frame_packets.get((student_id, size))
+    return cached[1] if cached is not None and cached[0] == etag else None
+
+def frame_packet(exam, student_id, size=None, etag=None):
+    """Binary packet for a student's latest frame (`size` from FRAME_SIZES, None = full), or None."""
+    packet = cached_frame_packet(exam, student_id, size, etag)
+    if packet is not None:
+        return packet
+    frame = live_frame(exam, student_id)
+    if frame is None:
+        return None
+    source_etag = frame[2]
+    if size:
+        frame = frame_variant(exam, student_id, frame, size)
+    header = json.dumps({'studentId': student_id, 'size': size or 'full', 'etag': frame[2]}).encode('utf-8')
+    packet = len(header).to_bytes(2, 'big') + header + frame[0]
+    exam.frame_packets[(student_id, size)] = (source_etag, packet)
+    return packet
+
+@exam_route('/live-screens')
+def get_live_screens(session):
+    """Metadata for every live screen; frames are fetched separately by URL"""
+    exam = get_exam(session)
+    capture_rate.viewer_polled(exam.name)
+    response = jsonify(exam.live_screens.snapshot())
+    response.add_etag()
+    return response.make_conditional(request)
+
+@exam_route('/screen/<student_id>.jpg')
+def get_screen(session, student_id):
+    """Latest frame for one student, optionally `?size=thumb|preview`.
+
+    `?v=` only busts caches; the ETag decides.
+    """
+    exam = get_exam(session)
+    frame = live_frame(exam, student_id)
+    if frame is None:
+        return jsonify({'error': 'no screen for this student'}), 404
+    size = request.args.get('size')
+    if size in FRAME_SIZES:
+        frame = frame_variant(exam, student_id, frame, size)
+    if size != 'thumb':
+        # Someone has this student open full-size: keep them at the live rate
+        capture_rate.mark_watched(capture_key(exam, student_id))
+    image, mimetype, etag = frame
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(image, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# --- Replay ---
+
+def replay_time(value):
+    """`?t=` as epoch seconds: a number (negative = seconds ago) or an ISO 8601 time, else None."""
+    if not value:
+        return None
+    try:
+        t = float(value)
+        return time.time() + t if t < 0 else t
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+def replay_entry(exam, student_id, entry):
+    t, segment, offset, length = entry
+    return {
+        't': t,
+        'segment': f'{exam.url_prefix}/replay/{quote(student_id, safe="")}/segments/{segment}',
+        'offset': offset,
+        'length': length
+    }
 
-@app.route('/flags')
-def get_flags():
-    """Return all recorded flags for the violation log"""
-    return jsonify(list(reversed(flags)))
+@exam_route('/replay/<student_id>')
+def replay_frame(session, student_id):
+    """The archived frame a student's screen showed at `?t=` (the last one at or before it)"""
+    exam = get_exam(session)
+    t = replay_time(request.args.get('t'))
+    if t is None:
+        return jsonify({'error': 't must be epoch seconds, negative seconds ago, or ISO 8601'}), 400
+    entry = archive.seek(student_id, t, session=exam.name)
+    image = archive.read(student_id, entry, session=exam.name) if entry else None
+    if image is None:
+        return jsonify({'error': 'no recorded frame at or before that time'}), 404
+    frame_time, segment, offset, _ = entry
+    etag = f'{segment}-{offset}'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(image, mimetype=image_mimetype(image))
+    response.set_etag(etag)
+    response.headers['X-Frame-Time'] = f'{frame_time:.3f}'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@exam_route('/replay/<student_id>/frames')
+def replay_frames(session, student_id):
+    """Index of archived frames between `?from=` and `?to=`, for scrubbing with Range requests"""
+    exam = get_exam(session)
+    start = replay_time(request.args.get('from'))
+    end = replay_time(request.args.get('to'))
+    limit = min(max(request.args.get('limit', 1000, type=int), 1), 5000)
+    entries = archive.frames(student_id, start, end, session=exam.name, limit=limit)
+    return jsonify([replay_entry(exam, student_id, entry) for entry in entries])
+
+@exam_route('/replay/<student_id>/segments/<segment>')
+def replay_segment(session, student_id, segment):
+    """A segment's raw frames; fetch one with `Range: bytes=<offset>-<offset + length - 1>`"""
+    path = archive.segment_path(student_id, segment, session=get_exam(session).name)
+    if path is None:
+        return jsonify({'error': 'no such segment'}), 404
+    # conditional=True answers Range requests with 206 Partial Content
+    return send_file(path, mimetype='application/octet-stream', conditional=True, max_age=0)
+
+# --- MJPEG ---
+
+# The modal's <img> points at /screen/<id>/mjpeg and the browser swaps in each
+# part as it arrives. Nothing is produced for a student no one has open.
+MJPEG_BOUNDARY = b'frame'
+MJPEG_MIMETYPE = 'multipart/x-mixed-replace; boundary=frame'
+# Each frame is framed once for every watcher (the session's mjpeg_parts).
+
+def mjpeg_part(exam, student_id, etag=None):
+    """(etag, multipart part) for a student's latest frame, or None if there is none."""
+    cached = exam.mjpeg_parts.get(student_id)
+    if cached is not None and etag is not None and cached[0] == etag:
+        return cached
+    frame = live_frame(exam, student_id)
+    if frame is None:
+        return None
+    image, mimetype, etag = frame
+    if cached is None or cached[0] != etag:
+        head = b'--%s\r\nContent-Type: %s\r\nContent-Length: %d\r\n\r\n' % (
+            MJPEG_BOUNDARY, mimetype.encode('ascii'), len(image))
+        cached = exam.mjpeg_parts[student_id] = (etag, head + image + b'\r\n')
+    return cached
+
+def mjpeg_update(event, student_id):
+    """The new frame's etag if `event` is a screen update for `student_id`, else None."""
+    if event.type == 'live_screen_update' and event.message['studentId'] == student_id:
+        return event.message['data'].get('etag')
+    return None
+
+@exam_route('/screen/<student_id>/mjpeg')
+def screen_mjpeg(session, student_id):
+    """One student's frames as they arrive, for a plain <img> (multipart/x-mixed-replace)"""
+    exam = get_exam(session)
+    if not exam.admits_viewer():
+        return too_many_viewers()
+    subscriber = exam.hub.subscribe()
+
+    def parts():
+        try:
+            part = mjpeg_part(exam, student_id)
+            while True:
+                if part is not None:
+                    capture_rate.mark_watched(capture_key(exam, student_id))
+                    yield part[1]
+                # Wait for this student's next frame; on a quiet spell resend the last one
+                # so proxies see traffic and a closed tab is noticed
+                while True:
+                    event = subscriber.get(timeout=30)
+                    if event is None:
+                        break
+                    etag = mjpeg_update(event, student_id)
+                    if etag is not None and (part is None or etag != part[0]):
+                        part = mjpeg_part(exam, student_id, etag)
+                        break
+        except EOFError:
+            return
+        finally:
+            exam.hub.unsubscribe(subscriber)
+
+    response = Response(parts(), mimetype=MJPEG_MIMETYPE)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@exam_route('/flags')
+def get_flags(session):
+    """Flags for the violation log, without screenshot payloads.
+
+    Without `since` this is every flag, newest first. With `?since=<id>` it
+    is the flags after that id, oldest first, at most `limit` of them, so a
+    poller can keep the last id it saw as a cursor.
+    """
+    exam = get_exam(session)
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify(flags.all(exam.name))
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 500)
+    return jsonify(flags.since(since, limit, exam.name))
+
+@app.route('/flags/<int:flag_id>/screenshot')
+def get_flag_screenshot(flag_id):
+    """Screenshot evidence for one flag, fetched lazily by the log views (`?size=thumb` for lists)"""
+    screenshot = flags.screenshot(flag_id)
+    if screenshot is None:
+        return jsonify({'error': 'no screenshot for this flag'}), 404
+    image, mimetype, etag = screenshot
+    size = request.args.get('size')
+    if size in FRAME_SIZES:
+        etag = f'{etag}-{size}'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        # Evidence never changes, so a thumbnail is only scaled once per browser
+        smaller = scaled(image, FRAME_SIZES[size]) if size in FRAME_SIZES else None
+        response = Response(smaller or image, mimetype='image/jpeg' if smaller else mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/blob/<blob_hash>')
+def get_blob(blob_hash):
+    """A screenshot by content hash (`?size=thumb` for lists); the URL's bytes never change"""
+    blob = blobs.get(blob_hash)
+    if blob is None:
+        return jsonify({'error': 'no such blob'}), 404
+    image, mimetype = blob
+    etag = blob_hash
+    size = request.args.get('size')
+    if size in FRAME_SIZES:
+        etag = f'{etag}-{size}'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        smaller = scaled(image, FRAME_SIZES[size]) if size in FRAME_SIZES else None
+        response = Response(smaller or image, mimetype='image/jpeg' if smaller else mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = IMMUTABLE
+    return response
 
 # --- WebRTC Signaling ---
 
-@app.route('/signal/offer', methods=['POST'])
-def signal_offer():
-    """Student posts their complete offer SDP (with ICE candidates baked in)"""
-    data = request.json
-    student_id = data['studentId']
-    webrtc_offers[student_id] = data['offer']
-    # Clear any stale answer from a previous session
-    webrtc_answers.pop(student_id, None)
-    # Notify all monitors so they can connect
-    broadcast({
+# Every viewer gets its own peer connection to each student: a signaling
+# session keyed by (student, viewer), so two monitors no longer overwrite
+# each other's answer. A viewer asks, the student offers, the viewer answers:
+#
+#   viewer  POST /signal/request {studentId, viewerId}          -> student's inbox
+#   student POST /signal/offer   {studentId, viewerId, offer}   -> webrtc_offer event
+#   viewer  POST /signal/answer  {studentId, viewerId, answer}  -> student's inbox
+#
+# Either side renegotiates by repeating its step: a new request gets a fresh
+# offer, and a new offer replaces the viewer's connection. POST
+# /signal/close ends a viewer's sessions.
+#
+# A student reads its inbox in one long-poll (/signal/inbox/<id>?wait=).
+# Whichever worker takes a viewer's message wakes just that request. The
+# inbox has one slot per viewer (the newest message wins). A message nobody
+# collects within SIGNAL_TTL seconds is discarded. Signaling stays within
+# an exam session: its offers and inboxes are the session's.
+SIGNAL_WAIT_SECONDS = 25
+SIGNAL_TTL = 60
+signal_waiters = {}  # {(session, studentId): {notify callback}}, this worker's parked inbox requests
+signal_lock = threading.Lock()
+
+def session_key(student_id, viewer_id):
+    return f'{student_id}\n{viewer_id}'
+
+
+def watch_signals(exam, student_id, notify):
+    with signal_lock:
+        signal_waiters.setdefault((exam.name, student_id), set()).add(notify)
+
+def unwatch_signals(exam, student_id, notify):
+    key = (exam.name, student_id)
+    with signal_lock:
+        waiters = signal_waiters.get(key)
+        if waiters is not None:
+            waiters.discard(notify)
+            if not waiters:
+                del signal_waiters[key]
+
+def signal_posted(envelope):
+    """Wake the requests waiting on a student's inbox (state subscriber, every worker)."""
+    student_id = envelope.get('signalFor')
+    if student_id is None:
+        return
+    with signal_lock:
+        waiters = list(signal_waiters.get((envelope.get('session', DEFAULT_SESSION), student_id), ()))
+    for notify in waiters:
+        notify()
+
+state.subscribe(signal_posted)
+
+def send_signal(exam, student_id, viewer_id, message):
+    """Put a message from `viewer_id` in the student's inbox and wake its long-poll."""
+    exam.signal_inbox[session_key(student_id, viewer_id)] = {
+        **message, 'viewerId': viewer_id, 'expires': time.time() + SIGNAL_TTL
+    }
+    state.publish({'session': exam.name, 'signalFor': student_id})
+
+def take_signals(exam, student_id):
+    """Every unexpired message in the student's inbox, removed so each is delivered once."""
+    prefix = session_key(student_id, '')
+    messages = []
+    for key in [key for key in exam.signal_inbox if key.startswith(prefix)]:
+        message = exam.signal_inbox.pop(key, None)  # None: another request took it first
+        if message is not None and message.pop('expires') >= time.time():
+            messages.append(message)
+    return messages
+
+def signal_wait(args):
+    """Seconds to hold an inbox request open, from `?wait=` (0 = answer at once)."""
+    try:
+        wait = float(args.get('wait', 0))
+    except ValueError:
+        wait = 0
+    return min(max(wait, 0), SIGNAL_WAIT_SECONDS)
+
+def viewer_sessions(exam, viewer_id):
+    """(studentId, offer entry) for every signaling session this viewer has an offer in."""
+    return [(entry['studentId'], entry) for entry in exam.webrtc_offers.values() if entry['viewerId'] == viewer_id]
+
+def offers_for(exam, viewer_id):
+    """{studentId: offer SDP} addressed to one viewer."""
+    return {student_id: entry['offer'] for student_id, entry in viewer_sessions(exam, viewer_id)}
+
+def drop_sessions(exam, student_id):
+    """Forget every signaling session of a student who is gone."""
+    prefix = session_key(student_id, '')
+    for key in [key for key in exam.webrtc_offers if key.startswith(prefix)]:
+        exam.webrtc_offers.pop(key, None)
+    for key in [key for key in exam.signal_inbox if key.startswith(prefix)]:
+        exam.signal_inbox.pop(key, None)
+    exam.rtc_viewers.pop(student_id, None)
+
+def signal_fields(*names):
+    """The named fields from a JSON body (or the query string, for beacons); None if any is missing."""
+    data = request.get_json(silent=True) or request.args
+    values = [data.get(name) for name in names]
+    return None if any(value is None or value == '' for value in values) else values
+
+@exam_route('/signal/request', methods=['POST'])
+def signal_request(session):
+    """Viewer asks a student for a session (again, to renegotiate)"""
+    fields = signal_fields('studentId', 'viewerId')
+    if fields is None:
+        return jsonify({'status': 'error', 'error': 'studentId and viewerId are required'}), 400
+    send_signal(get_exam(session), *fields, {'type': 'request'})
+    return jsonify({'status': 'ok'})
+
+@exam_route('/signal/offer', methods=['POST'])
+def signal_offer(session):
+    """Student posts a complete offer SDP (with ICE candidates baked in) for one viewer"""
+    fields = signal_fields('studentId', 'viewerId', 'offer')
+    if fields is None:
+        return jsonify({'status': 'error', 'error': 'studentId, viewerId and offer are required'}), 400
+    student_id, viewer_id, offer = fields
+    exam = get_exam(session, create=True)
+    exam.liveness.seen(student_id)
+    exam.webrtc_offers[session_key(student_id, viewer_id)] = {
+        'studentId': student_id, 'viewerId': viewer_id, 'offer': offer
+    }
+    # Every monitor of the exam hears it; only the one it's addressed to connects
+    broadcast(exam, {
         'type': 'webrtc_offer',
         'studentId': student_id,
-        'offer': data['offer']
+        'viewerId': viewer_id,
+        'offer': offer
     })
     return jsonify({'status': 'ok'})
 
-@app.route('/signal/answer', methods=['POST'])
-def signal_answer():
-    """Professor posts their complete answer SDP"""
-    data = request.json
-    student_id = data['studentId']
-    webrtc_answers[student_id] = data['answer']
+@exam_route('/signal/answer', methods=['POST'])
+def signal_answer(session):
+    """Viewer posts its complete answer SDP to a student's offer"""
+    fields = signal_fields('studentId', 'viewerId', 'answer')
+    if fields is None:
+        return jsonify({'status': 'error', 'error': 'studentId, viewerId and answer are required'}), 400
+    student_id, viewer_id, answer = fields
+    send_signal(get_exam(session), student_id, viewer_id, {'type': 'answer', 'answer': answer})
+    return jsonify({'status': 'ok'})
+
+@exam_route('/signal/close', methods=['POST'])
+def signal_close(session):
+    """Viewer ends its session with one student, or with all of them (a beacon when the monitor closes)"""
+    fields = signal_fields('viewerId')
+    if fields is None:
+        return jsonify({'status': 'error', 'error': 'viewerId is required'}), 400
+    exam = get_exam(session)
+    viewer_id = fields[0]
+    student_id = (request.get_json(silent=True) or request.args).get('studentId')
+    students = [student_id] if student_id else [sid for sid, _ in viewer_sessions(exam, viewer_id)]
+    for sid in students:
+        exam.webrtc_offers.pop(session_key(sid, viewer_id), None)
+        send_signal(exam, sid, viewer_id, {'type': 'close'})
+        set_rtc_state(exam, sid, viewer_id, False)
     return jsonify({'status': 'ok'})
 
-@app.route('/signal/answer/<student_id>')
-def get_answer(student_id):
-    """Student polls for the professor's answer"""
-    answer = webrtc_answers.get(student_id)
-    if answer:
-        return jsonify({'answer': answer})
-    return jsonify({'answer': None})
+# Viewers report which students they hold a live video track for. While
+# any viewer does, the student sends only keyframes (see capture_rate.py).
+# Monitors repeat their reports, and a report expires after RTC_REPORT_TTL
+# seconds, so a viewer that vanished without a word stops counting. One
+# session map holds {viewerId: report expiry} per student; a report racing
+# another viewer's on a second worker may be lost until its next repeat.
+RTC_REPORT_TTL = 60
+
+def rtc_live(exam, student_id):
+    """Whether any viewer currently has this student's live track."""
+    if exam is None:
+        return False
+    now = time.time()
+    return any(expires > now for expires in exam.rtc_viewers.get(student_id, {}).values())
+
+def set_rtc_state(exam, student_id, viewer_id, live):
+    """Record one viewer's track state; when the student's pace changes, tell it now, not at its next frame."""
+    was_live = rtc_live(exam, student_id)
+    now = time.time()
+    # Expired reports are dropped on every write, so an entry only holds current viewers
+    viewers = {v: expires for v, expires in exam.rtc_viewers.get(student_id, {}).items() if expires > now}
+    if live:
+        viewers[viewer_id] = now + RTC_REPORT_TTL
+    else:
+        viewers.pop(viewer_id, None)
+    if viewers:
+        exam.rtc_viewers[student_id] = viewers
+    else:
+        exam.rtc_viewers.pop(student_id, None)
+    if rtc_live(exam, student_id) != was_live:
+        # The '' slot is the server's own: it never collides with a viewer's request
+        send_signal(exam, student_id, '', {'type': 'capture', **capture_rate.advise(capture_key(exam, student_id))})
+
+@exam_route('/signal/state', methods=['POST'])
+def signal_state(session):
+    """Viewer reports students whose track is `live` (connected) and `down` (failed, closed)"""
+    data = request.get_json(silent=True) or {}
+    viewer_id = data.get('viewerId')
+    if not viewer_id:
+        return jsonify({'status': 'error', 'error': 'viewerId is required'}), 400
+    exam = get_exam(session)
+    for live, key in ((True, 'live'), (False, 'down')):
+        for student_id in data.get(key) or []:
+            set_rtc_state(exam, student_id, viewer_id, live)
+    return jsonify({'status': 'ok'})
 
-@app.route('/signal/offers')
-def get_offers():
-    """Professor gets all pending offers (for when monitor loads after students join)"""
-    return jsonify(webrtc_offers)
+@exam_route('/signal/inbox/<student_id>')
+def get_signals(session, student_id):
+    """Student waits (up to `?wait=` seconds) for viewers' requests, answers and closes"""
+    exam = get_exam(session, create=True)
+    deadline = time.time() + signal_wait(request.args)
+    ready = threading.Event()
+    watch_signals(exam, student_id, ready.set)
+    try:
+        # Watching first, so a message posted while we look can't be missed
+        messages = take_signals(exam, student_id)
+        while not messages and ready.wait(max(deadline - time.time(), 0)):
+            ready.clear()
+            messages = take_signals(exam, student_id)
+    finally:
+        unwatch_signals(exam, student_id, ready.set)
+    return jsonify({'messages': messages})
+
+@exam_route('/signal/offers')
+def get_offers(session):
+    """Offers addressed to `?viewer=` (for when a monitor loads after students join)"""
+    return jsonify(offers_for(get_exam(session), request.args.get('viewer', '')))
 
 # --- End WebRTC Signaling ---
 
-@app.route('/stream')
-def stream():
+def parse_last_event_id(value):
+    """Last-Event-ID header (or ?lastEventId=) as an int, None if absent or garbled."""
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+@exam_route('/stream')
+def stream(session):
     """Server-Sent Events endpoint for real-time updates (supports multiple viewers)"""
-    client_queue = queue.Queue()
-    with sse_clients_lock:
-        sse_clients.append(client_queue)
+    exam = get_exam(session)
+    if not exam.admits_viewer():
+        return too_many_viewers()
+    # A reconnecting EventSource sends Last-Event-ID and gets just what it missed
+    subscriber = exam.hub.subscribe(last_event_id=parse_last_event_id(
+        request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    ))
+
+    coding = negotiate(request.headers.get('Accept-Encoding')) if SSE_COMPRESSION else None
 
     def event_stream():
+        # Per connection, flushed after every event, so nothing waits in a buffer
+        compressor = StreamCompressor(coding) if coding else None
         try:
             while True:
-                try:
-                    message = client_queue.get(timeout=30)
-                    yield f"data: {json.dumps(message)}\n\n"
-                except queue.Empty:
-                    yield f"data: {json.dumps({'type': 'heartbeat'})}\n\n"
+                event = subscriber.get(timeout=30)
+                chunk = HEARTBEAT if event is None else event.data
+                yield compression_stats.timed('stream', compressor.compress, chunk) if compressor else chunk
+        except EOFError:
+            # Evicted as a slow consumer; EventSource reconnects with a fresh buffer
+            if compressor:
+                yield compressor.finish()
         finally:
-            with sse_clients_lock:
-                if client_queue in sse_clients:
-                    sse_clients.remove(client_queue)
+            exam.hub.unsubscribe(subscriber)
+
+    response = Response(event_stream(), mimetype='text/event-stream')
+    response.vary.add('Accept-Encoding')
+    if coding:
+        response.headers['Content-Encoding'] = coding
+    return response
+
+# --- Delta sync (long-poll) ---
+
+# Under typical proxy idle timeouts, so a quiet long-poll isn't cut off
+SYNC_WAIT_SECONDS = 25
+
+def sync_snapshot(exam, flags_since, viewer_id=''):
+    """Everything a viewer of one exam session needs when it has no usable cursor."""
+    # Take the cursor first: an event landing mid-snapshot is sent again, never lost
+    cursor = exam.hub.last_id
+    return {
+        'cursor': cursor,
+        'reset': True,
+        'screens': exam.live_screens.snapshot(),
+        'flags': flags.since(flags_since, 10000, exam.name),
+        'offers': offers_for(exam, viewer_id),
+        'students': exam.liveness.snapshot()
+    }
 
-    return Response(event_stream(), mimetype='text/event-stream')
+def sync_response(exam, cursor, events, flags_since, viewer_id=''):
+    """Fold the events after `cursor` into one delta (or a snapshot after a resync)."""
+    delta = {'cursor': cursor, 'reset': False, 'screens': {}, 'flags': [], 'offers': {}, 'students': {}}
+    for event in events:
+        if event.type == 'resync':
+            return sync_snapshot(exam, flags_since, viewer_id)
+        message = event.message
+        if event.type == 'live_screen_update':
+            delta['screens'][message['studentId']] = message['data']
+        elif event.type == 'new_flag':
+            delta['flags'].append(message['data'])
+        elif event.type == 'webrtc_offer' and message['viewerId'] == viewer_id:
+            delta['offers'][message['studentId']] = message['offer']
+        elif event.type == 'student_status':
+            student_id = message['studentId']
+            delta['students'][student_id] = message['status']
+            if message['status'] == GONE:
+                delta['screens'].pop(student_id, None)
+                delta['offers'].pop(student_id, None)
+        delta['cursor'] = max(delta['cursor'], event.id)
+    return delta
+
+def sync_params(args):
+    """(cursor or None, flags_since, viewer id, wait seconds) from the /sync query string."""
+    def number(name, default, kind=int):
+        try:
+            return kind(args[name])
+        except (KeyError, ValueError):
+            return default
+    wait = min(max(number('wait', SYNC_WAIT_SECONDS, float), 0), SYNC_WAIT_SECONDS)
+    return number('cursor', None), number('flags_since', 0), args.get('viewer', ''), wait
+
+def drain(subscriber):
+    """Everything already queued for `subscriber`."""
+    return list(iter(lambda: subscriber.get(0), None))
+
+@exam_route('/sync')
+def sync(session):
+    """Long-poll: wait until screens, flags, offers or students change after `cursor`, return the delta"""
+    exam = get_exam(session)
+    capture_rate.viewer_polled(exam.name)
+    cursor, flags_since, viewer_id, wait = sync_params(request.args)
+    if cursor is None:
+        return jsonify(sync_snapshot(exam, flags_since, viewer_id))
+    if not exam.admits_viewer():
+        return too_many_viewers()
+
+    subscriber = exam.hub.subscribe(last_event_id=cursor)
+    try:
+        first = subscriber.get(timeout=wait)
+        events = [first, *drain(subscriber)] if first else []
+    except EOFError:
+        events = []
+    finally:
+        exam.hub.unsubscribe(subscriber)
+    return jsonify(sync_response(exam, cursor, events, flags_since, viewer_id))
+
+@app.route('/sessions')
+def list_sessions():
+    """Exam sessions open on this worker, with their students and viewers"""
+    return jsonify({
+        exam.name: {'students': len(exam.live_screens), 'viewers': len(exam.hub), 'url': exam.url_prefix or '/'}
+        for exam in exams
+    })
+
+@app.route('/sessions/<session>', methods=['POST'])
+def open_session(session):
+    """Open an exam session before any student joins, so its monitors can connect"""
+    exam = get_exam(session, create=True)
+    return jsonify({'session': exam.name, 'url': exam.url_prefix or '/'}), 201
+
+@app.route('/metrics')
+def metrics():
+    """Operational counters: SSE fan-out queue depth per session, flag write backlog"""
+    return jsonify({
+        'sessions': {exam.name: exam.stats() for exam in exams},
+        'sessions_closed': exams.closed,
+        'ingest': {**ingest_stats, **capture_rate.stats()},
+        'flag_store': flags.stats(),
+        'blobs': blobs.stats(),
+        'frame_archive': archive.stats(),
+        'state': state.stats(),
+        'static': static.stats(),
+        'compression': compression_stats.stats()
+    })
 
-@app.route('/dashboard')
-def dashboard():
-    html = '''
+DASHBOARD_HTML = '''
     <!DOCTYPE html>
     <html>
     <head>
@@ -267,6 +1133,17 @@ def dashboard():
                 text-align: center;
                 color: #7f8c8d;
             }
+            .load-older {
+                display: block;
+                margin: 20px auto;
+                padding: 10px 25px;
+                border: none;
+                border-radius: 20px;
+                background: white;
+                color: #2c3e50;
+                font-weight: bold;
+                cursor: pointer;
+            }
             .auto-refresh {
                 position: fixed;
                 top: 20px;
@@ -279,15 +1156,21 @@ def dashboard():
             }
         </style>
         <script>
+            // Under /s/<session>/ every request goes to that exam session
+            const BASE = location.pathname.startsWith('/s/') ? location.pathname.split('/', 3).join('/') : '';
+
             // Real-time updates using Server-Sent Events
-            const eventSource = new EventSource('/stream');
+            const eventSource = new EventSource(BASE + '/stream');
 
             eventSource.onmessage = function(event) {
                 const message = JSON.parse(event.data);
 
                 if (message.type === 'new_flag') {
-                    // New violation detected! Reload to show it
-                    console.log('🚨 New violation detected! Reloading...');
+                    // New violation detected! Insert it at the top
+                    console.log('🚨 New violation detected!');
+                    loadNewer();
+                } else if (message.type === 'resync') {
+                    // Missed more than the server could replay
                     location.reload();
                 } else if (message.type === 'heartbeat') {
                     // Keep-alive heartbeat, do nothing
@@ -298,6 +1181,56 @@ def dashboard():
             eventSource.onerror = function(error) {
                 console.error('SSE connection error, will retry...', error);
             };
+
+            // Rows are rendered by the server from the same template as the page
+            async function fetchRows(query) {
+                const res = await fetch(BASE + '/dashboard/rows?' + query);
+                const reply = await res.json();
+                document.getElementById('countFlags').textContent = reply.counts.flags;
+                document.getElementById('countStudents').textContent = reply.counts.students;
+                document.getElementById('countDomains').textContent = reply.counts.domains;
+                const holder = document.createElement('div');
+                holder.innerHTML = reply.html;
+                return { rows: Array.from(holder.children), more: reply.more };
+            }
+
+            function flagIds() {
+                return Array.from(document.querySelectorAll('#flagList .flag'), el => Number(el.dataset.flagId));
+            }
+
+            let loadingNewer = false;
+            let newerPending = false;
+            async function loadNewer() {
+                if (loadingNewer) {
+                    // A flag arrived mid-fetch: fetch again once this one lands
+                    newerPending = true;
+                    return;
+                }
+                loadingNewer = true;
+                let full = false;
+                try {
+                    const list = document.getElementById('flagList');
+                    const { rows } = await fetchRows('after=' + Math.max(0, ...flagIds()));
+                    // Newest first, like the rest of the list
+                    rows.forEach(row => list.insertBefore(row, list.firstChild));
+                    const empty = document.getElementById('noFlags');
+                    if (empty && rows.length) empty.remove();
+                    full = rows.length === {{ page_size }};
+                } finally {
+                    loadingNewer = false;
+                    if (newerPending || full) {
+                        newerPending = false;
+                        loadNewer();
+                    }
+                }
+            }
+
+            async function loadOlder() {
+                const ids = flagIds();
+                const { rows, more } = await fetchRows('before=' + Math.min(...ids));
+                rows.forEach(row => document.getElementById('flagList').appendChild(row));
+                if (!more) document.getElementById('loadOlder').remove();
+            }
         </script>
     </head>
     <body>
@@ -312,22 +1245,37 @@ def dashboard():
 
         <div class="stats">
             <div class="stat-box">
-                <div class="stat-number">{{ flags|length }}</div>
+                <div class="stat-number" id="countFlags">{{ counts.flags }}</div>
                 <div class="stat-label">Total Flags</div>
             </div>
             <div class="stat-box">
-                <div class="stat-number">{{ unique_students|length }}</div>
+                <div class="stat-number" id="countStudents">{{ counts.students }}</div>
                 <div class="stat-label">Students Flagged</div>
             </div>
             <div class="stat-box">
-                <div class="stat-number">{{ unique_domains|length }}</div>
+                <div class="stat-number" id="countDomains">{{ counts.domains }}</div>
                 <div class="stat-label">Unique AI Sites</div>
             </div>
         </div>
 
-        {% if flags %}
-            {% for flag in flags %}
-            <div class="flag">
+        <div id="flagList">
+            {% for flag in flags %}{% include flag_row %}{% endfor %}
+        </div>
+        {% if flags|length == page_size %}
+            <button id="loadOlder" class="load-older" onclick="loadOlder()">Load older flags</button>
+        {% endif %}
+        {% if not flags %}
+            <div class="no-flags" id="noFlags">
+                <h2>✅ No Violations Detected</h2>
+                <p style="margin-top: 10px;">All students are following exam protocols</p>
+            </div>
+        {% endif %}
+    </body>
+    </html>
+'''
+
+FLAG_ROW_HTML = '''
+            <div class="flag" data-flag-id="{{ flag.id }}">
                 <div class="flag-header">
                     <span class="alert-badge">⚠️ UNAUTHORIZED ACCESS DETECTED</span>
                     <span class="timestamp">{{ flag.received_at }}</span>
@@ -368,7 +1316,7 @@ def dashboard():
                             <div style="margin-bottom: 10px;">
                                 <strong style="color: #d32f2f;">📋 Text Pasted:</strong><br>
                                 "{{ flag.pastedText }}"
-                                {% if flag.textLength > 500 %}
+                                {% if (flag.textLength or 0) > 500 %}
                                 <br><em style="color: #666;">(Showing first 500 of {{ flag.textLength }} characters)</em>
                                 {% endif %}
                             </div>
@@ -377,7 +1325,7 @@ def dashboard():
                             <div style="margin-bottom: 10px;">
                                 <strong style="color: #d32f2f;">📄 Text Copied:</strong><br>
                                 "{{ flag.copiedText }}"
-                                {% if flag.textLength > 500 %}
+                                {% if (flag.textLength or 0) > 500 %}
                                 <br><em style="color: #666;">(Showing first 500 of {{ flag.textLength }} characters)</em>
                                 {% endif %}
                             </div>
@@ -386,7 +1334,7 @@ def dashboard():
                             <div style="margin-bottom: 10px;">
                                 <strong style="color: #d32f2f;">⌨️ Text Typed:</strong><br>
                                 "{{ flag.typedText }}"
-                                {% if flag.textLength > 500 %}
+                                {% if (flag.textLength or 0) > 500 %}
                                 <br><em style="color: #666;">(Showing first 500 of {{ flag.textLength }} characters)</em>
                                 {% endif %}
                             </div>
@@ -400,48 +1348,61 @@ def dashboard():
                     <summary style="cursor: pointer; color: #3498db; font-weight: bold; margin-top: 10px;">
                         📸 View Screenshot Evidence
                     </summary>
-                    <img src="{{ flag.screenshot }}" alt="Screenshot Evidence">
+                    <a href="{{ flag.screenshot }}" target="_blank">
+                        <img src="{{ flag.screenshot }}?size=thumb" alt="Screenshot Evidence" loading="lazy">
+                    </a>
                 </details>
                 {% endif %}
             </div>
-            {% endfor %}
-        {% else %}
-            <div class="no-flags">
-                <h2>✅ No Violations Detected</h2>
-                <p style="margin-top: 10px;">All students are following exam protocols</p>
-            </div>
-        {% endif %}
-    </body>
-    </html>
-    '''
-
-    # Calculate stats
-    unique_students = set(flag['studentId'] for flag in flags)
-    unique_domains = set(flag['domain'] for flag in flags)
-
-    return render_template_string(
-        html,
-        flags=list(reversed(flags)),
-        unique_students=unique_students,
-        unique_domains=unique_domains
+'''
+
+# Compiled once at import; rendering is all that's left per request
+dashboard_template = app.jinja_env.from_string(DASHBOARD_HTML)
+flag_row_template = app.jinja_env.from_string(FLAG_ROW_HTML)
+DASHBOARD_PAGE_SIZE = 50
+
+@exam_route('/dashboard')
+def dashboard(session):
+    """Newest page of flags, streamed as it renders; older pages load on demand"""
+    exam = get_exam(session)
+    page = flags.page(limit=DASHBOARD_PAGE_SIZE, session=exam.name)
+    return stream_template(
+        dashboard_template,
+        flags=page,
+        flag_row=flag_row_template,
+        counts=flags.counts(exam.name),
+        page_size=DASHBOARD_PAGE_SIZE
     )
 
-@app.route('/grid')
-def grid_dashboard():
+@exam_route('/dashboard/rows')
+def dashboard_rows(session):
+    """Rendered flag rows for the dashboard: `?after=<id>` (new ones) or `?before=<id>` (older page)"""
+    exam = get_exam(session)
+    after = request.args.get('after', type=int)
+    if after is not None:
+        page = flags.since(after, DASHBOARD_PAGE_SIZE, exam.name)[::-1]
+        more = False
+    else:
+        page = flags.page(request.args.get('before', type=int), DASHBOARD_PAGE_SIZE + 1, exam.name)
+        more = len(page) > DASHBOARD_PAGE_SIZE
+        page = page[:DASHBOARD_PAGE_SIZE]
+    return jsonify({
+        'html': ''.join(render_template(flag_row_template, flag=flag) for flag in page),
+        'counts': flags.counts(exam.name),
+        'more': more
+    })
+
+@exam_route('/grid')
+def grid_dashboard(session):
     """Grid view dashboard - visual monitoring of all students"""
-    with open('grid-dashboard.html', 'r') as f:
-        return f.read()
+    return serve_page(session, 'grid-dashboard.html')
 
-@app.route('/demo')
-def demo():
+@exam_route('/demo')
+def demo(session):
     """Split-screen demo view - student simulation + live monitoring"""
-    with open('demo.html', 'r') as f:
-        return f.read()
+    return serve_page(session, 'demo.html')
 
-@app.route('/join')
-def join_exam():
-    """Student join page — share screen via browser, no extension needed"""
-    html = '''<!DOCTYPE html>
+JOIN_HTML = '''<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
@@ -588,6 +1549,9 @@ def join_exam():
     </div>
 
     <script>
+        // Under /s/<session>/ every request goes to that exam session
+        const BASE = location.pathname.startsWith('/s/') ? location.pathname.split('/', 3).join('/') : '';
+
         let stream = null;
         let captureWorker = null;
         let activeStudentId = null;
@@ -595,8 +1559,8 @@ def join_exam():
         let lastFlaggedLabel = '';
         let captureCount = 0;
         let flagCount = 0;
-        let peerConnection = null;
-        let answerPollInterval = null;
+        const peerConnections = {};  // {viewerId: RTCPeerConnection}, one per professor/TA watching
+        let signalAbort = null;
         const canvas = document.createElement('canvas');
         const ctx = canvas.getContext('2d');
         const video = document.createElement('video');
@@ -608,91 +1572,134 @@ def join_exam():
             ]
         };
 
+        // The server paces captures to its load: interval, JPEG quality and width
+        function applyCaptureHints(reply) {
+            if (reply.quality) captureQuality = reply.quality;
+            if (reply.max_width) captureMaxWidth = reply.max_width;
+            const ms = reply.next_interval_ms;
+            if (!ms || ms === captureIntervalMs || !captureWorker) return;
+            captureIntervalMs = ms;
+            captureWorker.postMessage(ms);
+        }
+
         function updateStats() {
             const el = document.getElementById('captureStats');
             if (el) el.textContent = 'Captures: ' + captureCount + ' | Flags: ' + flagCount;
         }
 
-        async function setupWebRTC(studentId, mediaStream) {
+        function updateRtcStatus() {
             const rtcEl = document.getElementById('rtcStatus');
-            try {
-                peerConnection = new RTCPeerConnection(RTC_CONFIG);
+            const states = Object.values(peerConnections).map(pc => pc.connectionState);
+            const live = states.filter(state => state === 'connected').length;
+            if (live) {
+                rtcEl.textContent = 'Live stream connected' + (live > 1 ? ' (' + live + ' viewers)' : '');
+                rtcEl.style.color = '#00843D';
+            } else if (states.some(state => state === 'disconnected' || state === 'failed')) {
+                rtcEl.textContent = 'Live stream disconnected — screenshots still active';
+                rtcEl.style.color = '#d63031';
+            } else {
+                rtcEl.textContent = 'Waiting for professor to connect...';
+                rtcEl.style.color = '';
+            }
+        }
 
-                // Add video track to peer connection
-                mediaStream.getVideoTracks().forEach(track => {
-                    peerConnection.addTrack(track, mediaStream);
-                });
+        // Signaling: one long-poll on our inbox brings every viewer's requests,
+        // answers and closes, so there is no per-viewer polling
+        async function startSignaling(studentId, mediaStream) {
+            if (!('RTCPeerConnection' in window)) {
+                const rtcEl = document.getElementById('rtcStatus');
+                rtcEl.textContent = 'Live stream unavailable — using screenshots';
+                rtcEl.style.color = '#e17055';
+                return;
+            }
+            updateRtcStatus();
+            signalAbort = new AbortController();
+            const signal = signalAbort.signal;
+            while (!signal.aborted) {
+                try {
+                    const res = await fetch(BASE + '/signal/inbox/' + encodeURIComponent(studentId) + '?wait=25', { signal });
+                    const data = await res.json();
+                    data.messages.forEach(message => handleSignal(studentId, mediaStream, message));
+                } catch (e) {
+                    if (e.name === 'AbortError') return;
+                    console.error('Signaling error:', e);
+                    await new Promise(resolve => setTimeout(resolve, 2000));
+                }
+            }
+        }
+
+        async function handleSignal(studentId, mediaStream, message) {
+            const viewerId = message.viewerId;
+            const pc = peerConnections[viewerId];
+            if (message.type === 'request') {
+                offerTo(studentId, viewerId, mediaStream);
+            } else if (message.type === 'close') {
+                if (pc) pc.close();
+                delete peerConnections[viewerId];
+                updateRtcStatus();
+            } else if (message.type === 'capture') {
+                // A viewer's live track came up or went down: keyframes only, or back to full rate
+                applyCaptureHints(message);
+            } else if (message.type === 'answer' && pc && pc.signalingState === 'have-local-offer') {
+                try {
+                    await pc.setRemoteDescription(new RTCSessionDescription(message.answer));
+                } catch (e) {
+                    console.error('WebRTC answer error:', e);
+                }
+            }
+        }
 
-                // Create offer
-                const offer = await peerConnection.createOffer();
-                await peerConnection.setLocalDescription(offer);
+        // A fresh connection per request, so a viewer renegotiates by asking again
+        async function offerTo(studentId, viewerId, mediaStream) {
+            if (peerConnections[viewerId]) peerConnections[viewerId].close();
+            const pc = new RTCPeerConnection(RTC_CONFIG);
+            peerConnections[viewerId] = pc;
+            pc.addEventListener('connectionstatechange', updateRtcStatus);
+            try {
+                // The same track goes to every viewer's connection
+                mediaStream.getVideoTracks().forEach(track => pc.addTrack(track, mediaStream));
+                await pc.setLocalDescription(await pc.createOffer());
 
                 // Wait for ICE gathering to complete (bakes candidates into SDP)
                 await new Promise((resolve) => {
-                    if (peerConnection.iceGatheringState === 'complete') {
+                    if (pc.iceGatheringState === 'complete') {
                         resolve();
                     } else {
-                        peerConnection.addEventListener('icegatheringstatechange', () => {
-                            if (peerConnection.iceGatheringState === 'complete') resolve();
+                        pc.addEventListener('icegatheringstatechange', () => {
+                            if (pc.iceGatheringState === 'complete') resolve();
                         });
                         // Fallback timeout — don't wait forever
                         setTimeout(resolve, 5000);
                     }
                 });
+                if (peerConnections[viewerId] !== pc) return;  // superseded by a newer request
 
-                // Send complete offer (with ICE candidates) to signaling server
-                await fetch('/signal/offer', {
+                await fetch(BASE + '/signal/offer', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
                     body: JSON.stringify({
                         studentId: studentId,
-                        offer: peerConnection.localDescription
+                        viewerId: viewerId,
+                        offer: pc.localDescription
                     })
                 });
-
-                rtcEl.textContent = 'Waiting for professor to connect...';
-
-                // Poll for answer from professor
-                answerPollInterval = setInterval(async () => {
-                    try {
-                        const res = await fetch('/signal/answer/' + encodeURIComponent(studentId));
-                        const data = await res.json();
-                        if (data.answer) {
-                            clearInterval(answerPollInterval);
-                            answerPollInterval = null;
-                            await peerConnection.setRemoteDescription(new RTCSessionDescription(data.answer));
-                            rtcEl.textContent = 'Live stream connected';
-                            rtcEl.style.color = '#00843D';
-                        }
-                    } catch (e) {
-                        console.error('Answer poll error:', e);
-                    }
-                }, 1500);
-
-                // Monitor connection state
-                peerConnection.addEventListener('connectionstatechange', () => {
-                    const state = peerConnection.connectionState;
-                    if (state === 'connected') {
-                        rtcEl.textContent = 'Live stream connected';
-                        rtcEl.style.color = '#00843D';
-                    } else if (state === 'disconnected' || state === 'failed') {
-                        rtcEl.textContent = 'Live stream disconnected — screenshots still active';
-                        rtcEl.style.color = '#d63031';
-                    }
-                });
-
             } catch (e) {
-                console.error('WebRTC setup error:', e);
-                rtcEl.textContent = 'Live stream unavailable — using screenshots';
-                rtcEl.style.color = '#e17055';
+                console.error('WebRTC offer error:', e);
             }
         }
 
-        // Web Worker that keeps ticking even when tab is in background
+        // Web Worker that keeps ticking even when tab is in background.
+        // Posting it a number changes the interval (the server backs idle screens off).
+        let captureIntervalMs = 1000;
+        let captureQuality = 0.3;
+        let captureMaxWidth = 960;
         function startWorkerTimer(studentId) {
             if (captureWorker) captureWorker.terminate();
+            captureIntervalMs = 1000;
             const blob = new Blob([
-                'setInterval(function(){ postMessage("tick"); }, 1000);'
+                'function tick(){ postMessage("tick"); }'
+                + 'let timer = setInterval(tick, 1000);'
+                + 'onmessage = function(e){ clearInterval(timer); timer = setInterval(tick, e.data); };'
             ], { type: 'application/javascript' });
             captureWorker = new Worker(URL.createObjectURL(blob));
             captureWorker.onmessage = function() {
@@ -776,10 +1783,11 @@ def join_exam():
                 stream.getVideoTracks()[0].onended = () => stopSharing();
 
                 // Use Web Worker timer so captures continue when this tab is in background
+                openFrameSocket(studentId);
                 startWorkerTimer(studentId);
 
                 // Set up WebRTC for real-time video streaming to professor
-                setupWebRTC(studentId, stream);
+                startSignaling(studentId, stream);
 
             } catch (err) {
                 document.getElementById('status').className = 'status error';
@@ -802,6 +1810,31 @@ def join_exam():
             sendFlagBeacon(activeStudentId, type, detail + ' (switch #' + tabAwayCount + ')');
         }
 
+        // Screenshots are uploaded as raw JPEG bodies with the metadata in
+        // the query string, so nothing gets base64-encoded on either side.
+        function uploadUrl(path, meta) {
+            return BASE + path + '?' + new URLSearchParams(meta).toString();
+        }
+
+        function flagMeta(studentId, flagType, detail, domain) {
+            return {
+                studentId: studentId,
+                domain: domain || flagType,
+                fullUrl: detail,
+                flagType: flagType,
+                timestamp: new Date().toISOString()
+            };
+        }
+
+        // toBlob is async, which sendBeacon can't wait for — decode the data URL instead
+        function dataUrlToBlob(dataUrl) {
+            const parts = dataUrl.split(',');
+            const bytes = atob(parts[1]);
+            const buf = new Uint8Array(bytes.length);
+            for (let i = 0; i < bytes.length; i++) buf[i] = bytes.charCodeAt(i);
+            return new Blob([buf], { type: 'image/jpeg' });
+        }
+
         // sendBeacon version — guaranteed delivery even when page is hiding
         function sendFlagBeacon(studentId, flagType, detail, domain) {
             let screenshot = null;
@@ -810,20 +1843,13 @@ def join_exam():
                     canvas.width = video.videoWidth;
                     canvas.height = video.videoHeight;
                     ctx.drawImage(video, 0, 0);
-                    screenshot = canvas.toDataURL('image/jpeg', 0.5);
+                    screenshot = dataUrlToBlob(canvas.toDataURL('image/jpeg', 0.5));
                 }
             } catch(e) {}
 
-            const payload = JSON.stringify({
-                studentId: studentId,
-                domain: domain || flagType,
-                fullUrl: detail,
-                flagType: flagType,
-                timestamp: new Date().toISOString(),
-                screenshot: screenshot
-            });
             // sendBeacon is fire-and-forget, survives page hide
-            navigator.sendBeacon('/flag', new Blob([payload], { type: 'application/json' }));
+            navigator.sendBeacon(uploadUrl('/flag', flagMeta(studentId, flagType, detail, domain)),
+                screenshot || new Blob([], { type: 'image/jpeg' }));
             flagCount++;
             updateStats();
         }
@@ -842,27 +1868,43 @@ def join_exam():
                 canvas.width = video.videoWidth;
                 canvas.height = video.videoHeight;
                 ctx.drawImage(video, 0, 0);
-                screenshot = canvas.toDataURL('image/jpeg', 0.6);
+                screenshot = await new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', 0.6));
             }
 
             try {
-                await fetch('/flag', {
+                await fetch(uploadUrl('/flag', flagMeta(studentId, flagType, detail, domain)), {
                     method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({
-                        studentId: studentId,
-                        domain: domain || flagType,
-                        fullUrl: detail,
-                        flagType: flagType,
-                        timestamp: new Date().toISOString(),
-                        screenshot: screenshot
-                    })
+                    headers: { 'Content-Type': 'image/jpeg' },
+                    body: screenshot || new Blob([])
                 });
             } catch (e) {
                 console.error('Failed to send flag:', e);
             }
         }
 
+        // Frames go over a WebSocket when the server has one (uvicorn), else one POST each
+        let frameSocket = null;
+        let frameSocketMeta = '';
+
+        function openFrameSocket(studentId) {
+            if (!('WebSocket' in window)) return;
+            const ws = new WebSocket((location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host
+                + BASE + '/ws/student?studentId=' + encodeURIComponent(studentId));
+            ws.onopen = function() {
+                frameSocket = ws;
+                frameSocketMeta = '';
+            };
+            ws.onmessage = function(e) {
+                applyCaptureHints(JSON.parse(e.data));
+            };
+            ws.onclose = function() {
+                // Only retry a socket that worked: no endpoint means HTTP-only server
+                const wasOpen = frameSocket === ws;
+                if (wasOpen) frameSocket = null;
+                if (wasOpen && activeStudentId === studentId) setTimeout(() => openFrameSocket(studentId), 2000);
+            };
+        }
+
         let sendingInProgress = false;
         let wasHidden = false;
         let hiddenSince = 0;
@@ -909,28 +1951,45 @@ def join_exam():
                 else if (surfaceType === 'monitor') currentTitle = 'Full Screen';
             }
 
-            // Scale down for fast streaming — cap at 960px wide
-            const scale = Math.min(1, 960 / (video.videoWidth || 960));
+            // Scale down for fast streaming — cap at the server's max width (960px by default)
+            const scale = Math.min(1, captureMaxWidth / (video.videoWidth || 960));
             canvas.width = Math.round((video.videoWidth || 960) * scale);
             canvas.height = Math.round((video.videoHeight || 540) * scale);
             ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
 
-            const screenshot = canvas.toDataURL('image/jpeg', 0.3);
-            document.getElementById('previewImg').src = screenshot;
-
             try {
-                await fetch('/live-update', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({
+                const screenshot = await new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', captureQuality));
+                const previewImg = document.getElementById('previewImg');
+                if (previewImg.src) URL.revokeObjectURL(previewImg.src);
+                previewImg.src = URL.createObjectURL(screenshot);
+
+                const meta = {
+                    currentUrl: usingCamera ? 'camera://front' : surfaceType + '://' + (label || 'browser'),
+                    currentTitle: currentTitle,
+                    type: 'LIVE_UPDATE'
+                };
+                if (frameSocket) {
+                    // Persistent socket: metadata only when it changes, the frame as raw binary.
+                    // The reply (capture hints) arrives on the socket's onmessage
+                    if (frameSocket.bufferedAmount > 0) return;  // previous frame still sending
+                    const metaText = JSON.stringify(meta);
+                    if (metaText !== frameSocketMeta) {
+                        frameSocket.send(metaText);
+                        frameSocketMeta = metaText;
+                    }
+                    frameSocket.send(screenshot);
+                } else {
+                    const res = await fetch(uploadUrl('/live-update', {
                         studentId: studentId,
-                        screenshot: screenshot,
-                        currentUrl: usingCamera ? 'camera://front' : surfaceType + '://' + (label || 'browser'),
-                        currentTitle: currentTitle,
                         timestamp: new Date().toISOString(),
-                        type: 'LIVE_UPDATE'
-                    })
-                });
+                        ...meta
+                    }), {
+                        method: 'POST',
+                        headers: { 'Content-Type': 'image/jpeg' },
+                        body: screenshot
+                    });
+                    applyCaptureHints(await res.json());
+                }
                 captureCount++;
                 updateStats();
             } catch (e) {
@@ -940,10 +1999,21 @@ def join_exam():
             }
         }
 
+        // Tell the server we're done, so the professor's grid drops us now rather than after the TTL
+        function sendLeaveBeacon() {
+            if (activeStudentId) navigator.sendBeacon(uploadUrl('/leave', { studentId: activeStudentId }));
+        }
+        window.addEventListener('pagehide', sendLeaveBeacon);
+
         function stopSharing() {
+            sendLeaveBeacon();
             if (captureWorker) { captureWorker.terminate(); captureWorker = null; }
-            if (answerPollInterval) { clearInterval(answerPollInterval); answerPollInterval = null; }
-            if (peerConnection) { peerConnection.close(); peerConnection = null; }
+            if (frameSocket) { const ws = frameSocket; frameSocket = null; ws.close(); }
+            if (signalAbort) { signalAbort.abort(); signalAbort = null; }
+            Object.keys(peerConnections).forEach(viewerId => {
+                peerConnections[viewerId].close();
+                delete peerConnections[viewerId];
+            });
             if (stream) stream.getTracks().forEach(t => t.stop());
             stream = null;
             activeStudentId = null;
@@ -968,16 +2038,17 @@ def join_exam():
     </script>
 </body>
 </html>'''
-    return html
+
+@exam_route('/join')
+def join_exam(session):
+    """Student join page — share screen via browser, no extension needed"""
+    return serve_page(session, 'join.html')
 
 @app.route('/scc-logo.svg')
 def scc_logo():
-    return send_from_directory('.', 'scc-logo.svg', mimetype='image/svg+xml')
+    return serve_asset('scc-logo.svg')
 
-@app.route('/monitor')
-def monitor():
-    """Minimalist professor dashboard — clean, small fonts, no flash"""
-    html = '''<!DOCTYPE html>
+MONITOR_HTML = '''<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
@@ -1066,6 +2137,7 @@ def monitor():
         }
         .tile:hover { box-shadow: 0 2px 8px rgba(0,0,0,0.08); border-color: #bbb; }
         .tile.flagged { border-color: #d63031; border-width: 2px; }
+        .tile.stale { opacity: 0.5; }
         .tile-screen {
             width: 100%;
             aspect-ratio: 16/10;
@@ -1295,6 +2367,9 @@ def monitor():
     </div>
 
     <script>
+        // Under /s/<session>/ every request goes to that exam session
+        const BASE = location.pathname.startsWith('/s/') ? location.pathname.split('/', 3).join('/') : '';
+
         const students = {};
         const violationLog = [];
         let violationCount = 0;
@@ -1302,6 +2377,38 @@ def monitor():
         const peerConnections = {}; // {studentId: RTCPeerConnection}
         const remoteStreams = {};   // {studentId: MediaStream}
 
+        // This page's own signaling sessions: every monitor gets its own connection to each student
+        const viewerId = window.crypto && crypto.randomUUID ? crypto.randomUUID() : String(Math.random()).slice(2);
+        const sessionRequested = {}; // {studentId: when we last asked for an offer}
+
+        function requestSession(studentId) {
+            // Once per time a student comes online, or per failure: students without WebRTC never offer
+            if (Date.now() - (sessionRequested[studentId] || 0) < 10000) return;
+            sessionRequested[studentId] = Date.now();
+            fetch(BASE + '/signal/request', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ studentId: studentId, viewerId: viewerId })
+            }).catch(() => {});
+        }
+        window.addEventListener('pagehide', function() {
+            navigator.sendBeacon(BASE + '/signal/close?viewerId=' + encodeURIComponent(viewerId));
+        });
+
+        // Tell the server whose live track we hold: while anyone holds it, that
+        // student sends only keyframes. Reports expire, so live ones are repeated.
+        function reportRtcState(live, down) {
+            if (!live.length && !down.length) return;
+            fetch(BASE + '/signal/state', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ viewerId: viewerId, live: live, down: down })
+            }).catch(() => {});
+        }
+        setInterval(function() {
+            reportRtcState(Object.keys(peerConnections).filter(id => peerConnections[id].connectionState === 'connected'), []);
+        }, 20000);
+
         const RTC_CONFIG = {
             iceServers: [
                 { urls: 'stun:stun.l.google.com:19302' },
@@ -1343,6 +2450,14 @@ def monitor():
                     if (students[studentId]) students[studentId].rtcConnected = false;
                     renderGrid();
                 }
+                if (peerConnections[studentId] === pc) {
+                    if (pc.connectionState === 'connected') reportRtcState([studentId], []);
+                    else if (pc.connectionState !== 'connecting' && pc.connectionState !== 'new') reportRtcState([], [studentId]);
+                }
+                if (pc.connectionState === 'failed' && peerConnections[studentId] === pc && students[studentId]) {
+                    // Renegotiate: the student answers a new request with a fresh offer
+                    requestSession(studentId);
+                }
             };
 
             try {
@@ -1366,11 +2481,12 @@ def monitor():
                 });
 
                 // Send complete answer to signaling server
-                await fetch('/signal/answer', {
+                await fetch(BASE + '/signal/answer', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
                     body: JSON.stringify({
                         studentId: studentId,
+                        viewerId: viewerId,
                         answer: pc.localDescription
                     })
                 });
@@ -1379,86 +2495,124 @@ def monitor():
             }
         }
 
-        // Reliable polling — works even when SSE dies on Render
-        let knownFlagCount = 0;
+        // Flags the log already has
+        let lastFlagId = 0;
+        const seenFlagIds = new Set();
+
+        // One long-poll instead of three timers: /sync answers as soon as
+        // screens, flags or offers change, or after ~25s with an empty delta
+        let syncCursor = null;
+
+        async function syncLoop() {
+            while (true) {
+                try {
+                    let url = BASE + '/sync?viewer=' + encodeURIComponent(viewerId) + '&flags_since=' + lastFlagId;
+                    if (syncCursor !== null) url += '&cursor=' + syncCursor;
+                    const res = await fetch(url);
+                    applySync(await res.json());
+                } catch(e) {
+                    // Server restarting or network blip: back off briefly
+                    await new Promise(resolve => setTimeout(resolve, 2000));
+                }
+            }
+        }
 
-        async function pollScreens() {
-            try {
-                const res = await fetch('/live-screens');
-                const screens = await res.json();
-                Object.keys(screens).forEach(id => handleLive(id, screens[id]));
-            } catch(e) {}
+        function applySync(delta) {
+            const firstLoad = syncCursor === null;
+            Object.keys(delta.screens).forEach(id => handleLive(id, delta.screens[id]));
+            if (firstLoad) {
+                // Existing flags go straight into the log, without alerts
+                delta.flags.forEach(f => {
+                    if (markFlagSeen(f)) addToLog(f, true);
+                });
+                renderLog();
+            } else {
+                delta.flags.forEach(f => handleFlag(f));
+            }
+            Object.keys(delta.offers).forEach(id => {
+                // A snapshot lists every offer made to us; only new ones need a connection
+                if (!delta.reset || !peerConnections[id]) connectToStudent(id, delta.offers[id]);
+            });
+            if (delta.reset && !firstLoad) {
+                // Whoever the snapshot no longer lists left while we weren't listening
+                Object.keys(students).forEach(id => { if (!(id in delta.students)) removeStudent(id); });
+            }
+            Object.keys(delta.students).forEach(id => handleStatus(id, delta.students[id]));
+            syncCursor = delta.cursor;
         }
 
-        async function pollFlags() {
-            try {
-                const res = await fetch('/flags');
-                const allFlags = await res.json();
-                // Only process new flags we haven't seen
-                if (allFlags.length > knownFlagCount) {
-                    const newOnes = allFlags.slice(0, allFlags.length - knownFlagCount);
-                    newOnes.reverse().forEach(f => {
-                        handleFlag({
-                            studentId: f.studentId,
-                            domain: f.domain,
-                            fullUrl: f.fullUrl,
-                            flagType: f.flagType,
-                            timestamp: f.timestamp,
-                            screenshot: f.screenshot,
-                            received_at: f.received_at
-                        });
-                    });
-                    knownFlagCount = allFlags.length;
-                }
-            } catch(e) {}
+        function handleStatus(id, status) {
+            if (status === 'gone') return removeStudent(id);
+            if (status === 'online' && !peerConnections[id]) requestSession(id);
+            if (!students[id]) return;
+            students[id].stale = status === 'stale';
+            renderGrid();
         }
 
-        async function pollWebRTC() {
-            try {
-                const res = await fetch('/signal/offers');
-                const offers = await res.json();
-                Object.keys(offers).forEach(id => {
-                    if (!peerConnections[id]) connectToStudent(id, offers[id]);
-                });
-            } catch(e) {}
+        function removeStudent(id) {
+            if (peerConnections[id]) { peerConnections[id].close(); delete peerConnections[id]; }
+            delete remoteStreams[id];
+            delete sessionRequested[id];
+            const s = students[id];
+            if (s) {
+                ['screenshot', 'screenshotFull'].forEach(f => { if (s[f] && s[f].startsWith('blob:')) URL.revokeObjectURL(s[f]); });
+                delete students[id];
+            }
+            if (modalStudentId === id) closeModal();
+            renderGrid();
         }
 
-        // Also try SSE as a bonus (faster updates when it works)
-        try {
-            const eventSource = new EventSource('/stream');
-            eventSource.onmessage = function(e) {
-                const msg = JSON.parse(e.data);
-                if (msg.type === 'new_flag') handleFlag(msg.data);
-                else if (msg.type === 'live_screen_update') handleLive(msg.studentId, msg.data);
-                else if (msg.type === 'webrtc_offer') {
-                    connectToStudent(msg.studentId, msg.offer);
-                }
+        // Binary frames over a WebSocket when the server has one (uvicorn);
+        // otherwise tiles keep loading frames by URL
+        let frameSocket = null;
+
+        function connectFrameSocket() {
+            if (!('WebSocket' in window)) return;
+            const ws = new WebSocket((location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + BASE + '/ws/viewer');
+            ws.binaryType = 'arraybuffer';
+            ws.onopen = function() {
+                frameSocket = ws;
+                if (modalStudentId) watchStudent(modalStudentId);
             };
-        } catch(e) {}
+            ws.onmessage = function(e) {
+                if (typeof e.data !== 'string') handleFramePacket(e.data);
+            };
+            ws.onclose = function() {
+                // Only retry a socket that worked: no endpoint means HTTP-only server
+                const wasOpen = frameSocket === ws;
+                if (wasOpen) frameSocket = null;
+                if (wasOpen) setTimeout(connectFrameSocket, 2000);
+            };
+        }
 
-        // Poll every 1.5s for screens, 2s for flags, 5s for WebRTC offers
-        setInterval(pollScreens, 1500);
-        setInterval(pollFlags, 2000);
-        setInterval(pollWebRTC, 5000);
+        function watchStudent(id) {
+            // Full-size frames for the student in the modal, thumbnails for everyone
+            if (frameSocket) frameSocket.send(JSON.stringify({ watch: id }));
+        }
 
-        async function loadInitial() {
-            await pollScreens();
-            // Load all existing flags
-            try {
-                const res = await fetch('/flags');
-                const allFlags = await res.json();
-                allFlags.reverse().forEach(f => addToLog(f, true));
-                knownFlagCount = allFlags.length;
-                renderLog();
-            } catch(e) {}
-            await pollWebRTC();
+        function handleFramePacket(buffer) {
+            const headerLength = new DataView(buffer).getUint16(0);
+            const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 2, headerLength)));
+            const s = students[header.studentId];
+            if (!s) return;
+            const url = URL.createObjectURL(new Blob([new Uint8Array(buffer, 2 + headerLength)], { type: 'image/jpeg' }));
+            const field = header.size === 'full' ? 'screenshotFull' : 'screenshot';
+            if (s[field] && s[field].startsWith('blob:')) URL.revokeObjectURL(s[field]);
+            s[field] = url;
+            if (field === 'screenshot') renderGrid();
+            if (modalStudentId === header.studentId) updateModal(header.studentId);
         }
 
         function handleLive(id, data) {
             if (!students[id]) {
                 students[id] = { id: id, status: 'safe', violations: 0, site: '', screenshot: null };
             }
-            students[id].screenshot = data.screenshot;
+            // Tiles draw the small variant; the modal loads the full frame.
+            // With a frame socket open, images arrive as binary frames instead
+            if (!frameSocket || !students[id].screenshot) {
+                students[id].screenshot = data.screenshot;
+                students[id].screenshotFull = data.screenshotFull || data.screenshot;
+            }
             var title = data.currentTitle || '';
             if (title && title !== 'Screen Share' && title !== 'Full Screen') {
                 students[id].site = title;
@@ -1469,7 +2623,17 @@ def monitor():
             if (modalStudentId === id) updateModal(id);
         }
 
+        // A snapshot and the next delta can both carry the same flag — count it once
+        function markFlagSeen(flag) {
+            if (flag.id === undefined) return true;
+            if (seenFlagIds.has(flag.id)) return false;
+            seenFlagIds.add(flag.id);
+            lastFlagId = Math.max(lastFlagId, flag.id);
+            return true;
+        }
+
         function handleFlag(data) {
+            if (!markFlagSeen(data)) return;
             const id = data.studentId;
             if (!students[id]) {
                 students[id] = { id: id, status: 'safe', violations: 0, site: '', screenshot: null };
@@ -1477,7 +2641,12 @@ def monitor():
             students[id].status = 'flagged';
             students[id].violations++;
             students[id].site = data.domain;
-            if (data.screenshot) students[id].screenshot = data.screenshot;
+            if (data.screenshot) {
+                // The tile gets the thumbnail; the modal opens the full evidence
+                ['screenshot', 'screenshotFull'].forEach(f => { const u = students[id][f]; if (u && u.startsWith('blob:')) URL.revokeObjectURL(u); });
+                students[id].screenshot = data.screenshot + '?size=thumb';
+                students[id].screenshotFull = data.screenshot;
+            }
             violationCount++;
 
             addToLog(data, false);
@@ -1538,6 +2707,7 @@ def monitor():
         // Modal
         function openModal(id) {
             modalStudentId = id;
+            watchStudent(id);
             updateModal(id);
             document.getElementById('modal').classList.add('open');
         }
@@ -1566,12 +2736,25 @@ def monitor():
                     c.innerHTML = '';
                     c.appendChild(v);
                 }
+            } else if (frameSocket) {
+                // Full frames arrive over the frame socket as blob URLs
+                const src = s.screenshotFull || s.screenshot;
+                c.innerHTML = src ? '<img src="' + src + '">' : '<div class="modal-no-screen">No screen available</div>';
             } else {
-                c.innerHTML = s.screenshot ? '<img src="' + s.screenshot + '">' : '<div class="modal-no-screen">No screen available</div>';
+                // One long-lived MJPEG stream; the browser swaps in each new frame itself
+                const img = c.querySelector('img');
+                if (!img || img.dataset.sid !== id) {
+                    c.innerHTML = '<img data-sid="' + id + '" src="' + BASE + '/screen/' + encodeURIComponent(id) + '/mjpeg">';
+                }
             }
         }
         function closeModal() {
+            if (modalStudentId) watchStudent(null);
             modalStudentId = null;
+            // Dropping the <img> ends its MJPEG stream, so the server stops sending
+            const img = document.querySelector('#modalScreen img');
+            if (img) img.src = '';
+            document.getElementById('modalScreen').innerHTML = '';
             document.getElementById('modal').classList.remove('open');
         }
         document.getElementById('modal').addEventListener('click', function(e) { if (e.target === this) closeModal(); });
@@ -1617,7 +2800,7 @@ def monitor():
                     grid.appendChild(tile);
                 }
 
-                tile.className = 'tile' + (flagged ? ' flagged' : '');
+                tile.className = 'tile' + (flagged ? ' flagged' : '') + (s.stale ? ' stale' : '');
                 const vid = tile.querySelector('.tile-screen video');
                 const img = tile.querySelector('.tile-screen img');
                 const emptyLabel = tile.querySelector('.tile-screen .empty');
@@ -1680,7 +2863,7 @@ def monitor():
                     + '<td class="log-student">' + v.studentId + '</td>'
                     + '<td><span class="log-type ' + cls + '">' + typeName(v.type) + '</span></td>'
                     + '<td class="log-detail">' + (v.domain || '') + (v.detail ? '<br>' + v.detail : '') + '</td>'
-                    + '<td>' + (v.screenshot ? '<img class="log-thumb" src="' + v.screenshot + '" onclick="openScreenshot(this.src, \\'' + v.studentId + ' — ' + fmtTime(v.time).replace(/'/g,'') + '\\')">' : '<span style="color:#ccc">—</span>') + '</td>'
+                    + '<td>' + (v.screenshot ? '<img class="log-thumb" loading="lazy" src="' + v.screenshot + '" onclick="openScreenshot(this.src, \\'' + v.studentId + ' — ' + fmtTime(v.time).replace(/'/g,'') + '\\')">' : '<span style="color:#ccc">—</span>') + '</td>'
                     + '</tr>';
             }).join('');
 
@@ -1688,15 +2871,18 @@ def monitor():
             document.getElementById('logBadge').textContent = violationLog.length > 0 ? ' (' + violationLog.length + ')' : '';
         }
 
-        loadInitial();
+        syncLoop();
+        connectFrameSocket();
     </script>
 </body>
 </html>'''
-    return html
 
-@app.route('/')
-def index():
-    return '''
+@exam_route('/monitor')
+def monitor(session):
+    """Minimalist professor dashboard — clean, small fonts, no flash"""
+    return serve_page(session, 'monitor.html')
+
+INDEX_HTML = '''
     <html>
     <head>
         <title>Exam Monitor Server</title>
@@ -1758,6 +2944,51 @@ def index():
     </html>
     '''
 
+@app.route('/')
+def index():
+    return serve_asset('index.html')
+
+# --- Static assets ---
+
+# Loaded and compressed once; every page below is served from memory
+HTML = 'text/html; charset=utf-8'
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+static = AssetStore()
+static.add_file('scc-logo.svg', os.path.join(ASSET_DIR, 'scc-logo.svg'), 'image/svg+xml')
+static.add_file('grid-dashboard.html', os.path.join(ASSET_DIR, 'grid-dashboard.html'), HTML)
+static.add_file('demo.html', os.path.join(ASSET_DIR, 'demo.html'), HTML)
+# The logo URL carries its version, so browsers cache it for good
+for name, page in (('join.html', JOIN_HTML), ('monitor.html', MONITOR_HTML), ('index.html', INDEX_HTML)):
+    static.add(name, page.replace('"/scc-logo.svg"', f'"{static.url("scc-logo.svg")}"'), HTML)
+
+# Paths the ASGI server answers straight from the store
+STATIC_ROUTES = {
+    '/': 'index.html',
+    '/join': 'join.html',
+    '/monitor': 'monitor.html',
+    '/grid': 'grid-dashboard.html',
+    '/demo': 'demo.html',
+    '/scc-logo.svg': 'scc-logo.svg',
+}
+
+def serve_page(session, name):
+    """A page of one exam session: the same asset for all of them, its script reads the session from the URL."""
+    if not SESSION_NAME.match(session):
+        abort(404)
+    return serve_asset(name)
+
+def serve_asset(name):
+    if app.debug:
+        # Pick up edits to the HTML files without a restart
+        static.reload()
+    status, headers, body = static.serve(
+        name,
+        request.headers.get('Accept-Encoding'),
+        request.headers.get('If-None-Match'),
+        request.args.get('v')
+    )
+    return Response(body, status=status, headers=headers)
+
 if __name__ == '__main__':
     import os
     port = int(os.environ.get('PORT', 5001))
@@ -0,0 +1,233 @@
+"""Fan-out of server-sent events to many viewers with bounded memory.
+
+Each /stream connection gets a Subscriber holding at most `maxlen` pending
+events. Live screen updates carry a coalesce key (one per student), so a
+slow viewer keeps only the newest frame for each student rather than a
+backlog of stale ones. Other events are dropped oldest-first when the
+buffer is full, and a viewer that stays full for `evict_after` seconds is
+evicted so its connection can be torn down.
+
+publish() encodes a message exactly once, SSE framing and id included,
+into an immutable Event. Every subscriber queues a reference to the same
+bytes, so serialization cost does not grow with the number of viewers.
+Event ids increase monotonically (the caller can supply them, e.g. from a
+counter shared by every worker).
+
+The hub also keeps the last `replay` events in a ring. A viewer that
+reconnects with Last-Event-ID gets only the events it missed. If those are
+no longer in the ring (or the id is from before a restart) it gets a single
+`resync` event instead, telling it to reload a full snapshot.
+
+Subscribers can be drained by a blocking thread (WSGI) with get(timeout),
+or by a coroutine (ASGI) that passes a `notify` callback and polls with
+get(0) whenever it fires.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+def format_event(message, event_id=None):
+    """Encode one message as an SSE frame (`id:` line first when given)."""
+    data = json.dumps(message, separators=(',', ':'))
+    if event_id is None:
+        return f"data: {data}\n\n".encode('utf-8')
+    return f"id: {event_id}\ndata: {data}\n\n".encode('utf-8')
+
+
+class Event:
+    """One published message, encoded once and shared by every subscriber."""
+
+    __slots__ = ('id', 'type', 'message', 'json', 'data')
+
+    def __init__(self, event_id, message):
+        self.id = event_id
+        self.type = message.get('type')
+        self.message = message  # shared too: read it, never modify it
+        self.json = json.dumps(message, separators=(',', ':')).encode('utf-8')
+        self.data = b'id: %d\ndata: %s\n\n' % (event_id, self.json)
+
+    def __len__(self):
+        return len(self.data)
+
+
+# Sent when a viewer has had nothing for a while; encoded once at import
+HEARTBEAT = format_event({'type': 'heartbeat'})
+
+
+class Subscriber:
+    """Pending events for one SSE connection."""
+
+    def __init__(self, maxlen, evict_after, notify=None):
+        self.maxlen = maxlen
+        self.evict_after = evict_after
+        self.notify = notify
+        self.connected_at = time.time()
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.evicted = False
+        self._pending = OrderedDict()  # {coalesce key or seq: event}
+        self._seq = 0
+        self._full_since = None
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def offer(self, event, key=None):
+        """Queue an event without blocking. Returns False once evicted."""
+        accepted = self._offer(event, key)
+        if self.notify is not None:
+            self.notify()
+        return accepted
+
+    def _offer(self, event, key):
+        with self._cond:
+            if self.evicted:
+                return False
+            if key is not None and key in self._pending:
+                # Drop the stale payload and requeue at the back, so events
+                # leave in id order and Last-Event-ID never skips one
+                del self._pending[key]
+                self._pending[key] = event
+                self.coalesced += 1
+            else:
+                if len(self._pending) >= self.maxlen:
+                    now = time.time()
+                    if self._full_since is None:
+                        self._full_since = now
+                    elif now - self._full_since > self.evict_after:
+                        self.evicted = True
+                        self._pending.clear()
+                        self._cond.notify_all()
+                        return False
+                    self._pending.popitem(last=False)
+                    self.dropped += 1
+                if key is None:
+                    self._seq += 1
+                    key = ('seq', self._seq)
+                self._pending[key] = event
+            self._cond.notify()
+            return True
+
+    def get(self, timeout):
+        """Next Event, or None after `timeout` seconds with nothing queued.
+
+        Raises EOFError once the subscriber has been evicted.
+        """
+        with self._cond:
+            if not self._pending and not self.evicted and timeout:
+                self._cond.wait(timeout)
+            if self.evicted:
+                raise EOFError('evicted as a slow consumer')
+            if not self._pending:
+                return None
+            _, event = self._pending.popitem(last=False)
+            if len(self._pending) < self.maxlen:
+                self._full_since = None
+            self.delivered += 1
+            return event
+
+    def stats(self):
+        return {
+            'queue_depth': len(self._pending),
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'connected_for': round(time.time() - self.connected_at, 1),
+        }
+
+
+class EventHub:
+    """Registry of subscribers; publish() never blocks on a slow viewer."""
+
+    def __init__(self, maxlen=256, evict_after=30.0, replay=1024):
+        self.maxlen = maxlen
+        self.evict_after = evict_after
+        self.published = 0
+        self.evictions = 0
+        self.replayed = 0
+        self.resyncs = 0
+        self.bytes_encoded = 0
+        self.last_id = 0
+        self._subscribers = set()
+        self._ring = deque(maxlen=replay)  # [(Event, coalesce key)], oldest first
+        self._lock = threading.Lock()
+
+    def subscribe(self, notify=None, last_event_id=None):
+        """New subscriber; with `last_event_id`, pre-filled with what it missed."""
+        subscriber = Subscriber(self.maxlen, self.evict_after, notify)
+        with self._lock:
+            # Under the lock, so no event lands between the replay and the first publish
+            if last_event_id is not None:
+                self._catch_up(subscriber, last_event_id)
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def _catch_up(self, subscriber, last_event_id):
+        missed = [(event, key) for event, key in self._ring if event.id > last_event_id]
+        oldest = self._ring[0][0].id if self._ring else self.last_id + 1
+        if last_event_id > self.last_id or oldest > last_event_id + 1 or len(missed) > self.maxlen:
+            # The gap is older than the ring, or the id predates a restart
+            subscriber.offer(Event(self.last_id, {'type': 'resync'}))
+            self.resyncs += 1
+            return
+        for event, key in missed:
+            subscriber.offer(event, key)
+        self.replayed += len(missed)
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, message, key=None, event_id=None):
+        """Encode `message` once and queue it for every subscriber. Returns the Event."""
+        # Snapshot under the lock, deliver outside it: each subscriber has its own
+        with self._lock:
+            if event_id is None:
+                event_id = self.last_id + 1
+            self.last_id = max(self.last_id, event_id)
+            event = Event(event_id, message)
+            self._ring.append((event, key))
+            subscribers = list(self._subscribers)
+            self.published += 1
+            self.bytes_encoded += len(event)
+        for subscriber in subscribers:
+            if not subscriber.offer(event, key):
+                self.unsubscribe(subscriber)
+                with self._lock:
+                    self.evictions += 1
+        return event
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def pressure(self):
+        """How backed up viewers are on average: 0 = keeping up, 1 = buffers full."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            return 0.0
+        return sum(len(s) for s in subscribers) / (len(subscribers) * self.maxlen)
+
+    def stats(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        depths = [len(s) for s in subscribers]
+        return {
+            'clients': len(subscribers),
+            'published': self.published,
+            'last_id': self.last_id,
+            'replay_ring': len(self._ring),
+            'replayed': self.replayed,
+            'resyncs': self.resyncs,
+            'bytes_encoded': self.bytes_encoded,
+            'evictions': self.evictions,
+            'queue_depth_total': sum(depths),
+            'queue_depth_max': max(depths, default=0),
+            'dropped': sum(s.dropped for s in subscribers),
+            'coalesced': sum(s.coalesced for s in subscribers),
+            'per_client': [s.stats() for s in subscribers],
+        }
@@ -0,0 +1,256 @@
+"""Shared state and pub/sub, so several server processes see the same exam.
+
+A backend hands out named maps and publishes events to every process:
+LocalBackend (plain dicts, one process) by default, RedisBackend when
+STATE_BACKEND_URL=redis://... (needs `pip install redis`). Maps only see
+whole-value writes: assign `m[key] = value`, never mutate a value you got back.
+"""
+import json
+import threading
+import time
+from collections.abc import MutableMapping
+
+
+class JSONCodec:
+    @staticmethod
+    def encode(value):
+        return json.dumps(value).encode('utf-8')
+
+    @staticmethod
+    def decode(raw):
+        return json.loads(raw)
+
+
+class FrameCodec:
+    """(image bytes, mimetype, etag) <-> `mimetype\\0etag\\0bytes`."""
+
+    @staticmethod
+    def encode(value):
+        image, mimetype, etag = value
+        return mimetype.encode('ascii') + b'\0' + etag.encode('ascii') + b'\0' + image
+
+    @staticmethod
+    def decode(raw):
+        mimetype, etag, image = raw.split(b'\0', 2)
+        return image, mimetype.decode('ascii'), etag.decode('ascii')
+
+
+class LocalMap(dict):
+    def snapshot(self):
+        """Plain-dict copy of the whole map in one call."""
+        return dict(self)
+
+
+class LocalBackend:
+    """Single-process state: dicts, a counter, and synchronous delivery."""
+
+    shared = False
+
+    def __init__(self):
+        self._maps = {}
+        self._subscribers = []
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+
+    def map(self, name, codec=JSONCodec):
+        return self._maps.setdefault(name, LocalMap())
+
+    def incr(self, name):
+        with self._lock:
+            self._counters[name] = value = self._counters.get(name, 0) + 1
+        return value
+
+    def publish(self, message):
+        for callback in self._subscribers:
+            callback(message)
+
+    def publish_numbered(self, counter, message):
+        """Publish `message` with `id` set from `counter`; subscribers see the ids in order."""
+        with self._publish_lock:
+            message['id'] = self.incr(counter)
+            self.publish(message)
+        return message['id']
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def shared_blobs(self, name):
+        """None: with one process, a BlobStore's own memory is all there is."""
+        return None
+
+    def stats(self):
+        return {'backend': 'local'}
+
+
+class RedisMap(MutableMapping):
+    """A Redis hash that looks like a dict."""
+
+    def __init__(self, client, key, codec):
+        self._client = client
+        self._key = key
+        self._codec = codec
+
+    def __getitem__(self, field):
+        raw = self._client.hget(self._key, field)
+        if raw is None:
+            raise KeyError(field)
+        return self._codec.decode(raw)
+
+    def __setitem__(self, field, value):
+        self._client.hset(self._key, field, self._codec.encode(value))
+
+    def __delitem__(self, field):
+        if not self._client.hdel(self._key, field):
+            raise KeyError(field)
+
+    def __iter__(self):
+        return (field.decode('utf-8') for field in self._client.hkeys(self._key))
+
+    def __len__(self):
+        return self._client.hlen(self._key)
+
+    def __contains__(self, field):
+        return bool(self._client.hexists(self._key, field))
+
+    def pop(self, field, *default):
+        # HGET + HDEL in one round trip, atomic across workers
+        pipe = self._client.pipeline()
+        pipe.hget(self._key, field)
+        pipe.hdel(self._key, field)
+        raw, _ = pipe.execute()
+        if raw is None:
+            if default:
+                return default[0]
+            raise KeyError(field)
+        return self._codec.decode(raw)
+
+    def snapshot(self):
+        return {
+            field.decode('utf-8'): self._codec.decode(raw)
+            for field, raw in self._client.hgetall(self._key).items()
+        }
+
+
+# INCR and PUBLISH in one script: scripts run one at a time, so the channel
+# carries the ids in order. ARGV[1] is the message as a JSON object.
+PUBLISH_NUMBERED = """
+local id = redis.call('INCR', KEYS[1])
+redis.call('PUBLISH', KEYS[2], '{"id":' .. id .. ',' .. string.sub(ARGV[1], 2))
+return id
+"""
+
+
+# A blob's bytes and its reference count change together, so a release on
+# one worker can't delete bytes another worker has just referenced again.
+BLOB_ACQUIRE = """
+local count = redis.call('HINCRBY', KEYS[1], ARGV[1], 1)
+if count == 1 then
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+end
+return count
+"""
+
+BLOB_RELEASE = """
+local count = redis.call('HINCRBY', KEYS[1], ARGV[1], -1)
+if count <= 0 then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    redis.call('HDEL', KEYS[2], ARGV[1])
+end
+return count
+"""
+
+
+class RedisBlobs:
+    """Reference-counted blob bytes in two Redis hashes, shared by every worker."""
+
+    def __init__(self, client, key):
+        self._client = client
+        self._keys = [f'{key}:refs', f'{key}:data']
+        self._acquire = client.register_script(BLOB_ACQUIRE)
+        self._release = client.register_script(BLOB_RELEASE)
+
+    def acquire(self, key, data, mimetype):
+        """Add a reference to blob `key`, storing its bytes if it had none; returns the new count."""
+        return self._acquire(keys=self._keys, args=[key, mimetype.encode('ascii') + b'\0' + data])
+
+    def release(self, key):
+        """Drop a reference; the bytes go with the last one. Returns the count left."""
+        return self._release(keys=self._keys, args=[key])
+
+    def get(self, key):
+        """(data, mimetype), or None."""
+        raw = self._client.hget(self._keys[1], key)
+        if raw is None:
+            return None
+        mimetype, _, data = raw.partition(b'\0')
+        return data, mimetype.decode('ascii')
+
+
+class RedisBackend:
+    """State in Redis hashes, events on a Redis pub/sub channel."""
+
+    shared = True
+
+    def __init__(self, url, prefix='exam-monitor'):
+        import redis  # optional dependency, only needed for multi-process deployments
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+        self._channel = f'{prefix}:events'
+        self._subscribers = []
+        self._listener = None
+        self._publish_numbered = self._client.register_script(PUBLISH_NUMBERED)
+        self.received = 0
+
+    def map(self, name, codec=JSONCodec):
+        return RedisMap(self._client, f'{self._prefix}:{name}', codec)
+
+    def incr(self, name):
+        return self._client.incr(f'{self._prefix}:counter:{name}')
+
+    def publish(self, message):
+        self._client.publish(self._channel, JSONCodec.encode(message))
+
+    def publish_numbered(self, counter, message):
+        """Publish `message` with `id` set from `counter`; subscribers see the ids in order."""
+        return self._publish_numbered(
+            keys=[f'{self._prefix}:counter:{counter}', self._channel],
+            args=[JSONCodec.encode(message)]
+        )
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+        if self._listener is None:
+            self._listener = threading.Thread(target=self._listen, name='state-listener', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._channel)
+                for item in pubsub.listen():
+                    if item['type'] != 'message':
+                        continue
+                    self.received += 1
+                    message = JSONCodec.decode(item['data'])
+                    for callback in self._subscribers:
+                        callback(message)
+            except Exception as e:
+                print(f"⚠️  State backend subscription lost ({e}), reconnecting...")
+                time.sleep(1)
+
+    def shared_blobs(self, name):
+        return RedisBlobs(self._client, f'{self._prefix}:{name}')
+
+    def stats(self):
+        return {'backend': 'redis', 'events_received': self.received}
+
+
+def backend_from_url(url):
+    """LocalBackend for an empty URL, RedisBackend for redis:// / rediss:// / unix://."""
+    if not url:
+        return LocalBackend()
+    if url.split(':', 1)[0] in ('redis', 'rediss', 'unix'):
+        return RedisBackend(url)
+    raise ValueError(f'Unsupported STATE_BACKEND_URL: {url}')
@@ -0,0 +1,147 @@
+"""In-memory static assets (the HTML pages, the logo), precompressed once.
+
+serve() picks the br, gzip or identity variant by Accept-Encoding and answers
+If-None-Match with a 304. Fixed URLs are `no-cache`; versioned ones (`?v=`,
+see url()) are immutable. Brotli is optional (`pip install brotli`).
+"""
+import gzip
+import hashlib
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+# Below this a compressed body isn't worth the header bytes
+MIN_COMPRESS_SIZE = 256
+
+
+def accepted_encodings(header):
+    """Content codings the client accepts (q > 0) from an Accept-Encoding header."""
+    accepted = set()
+    for part in (header or '').split(','):
+        coding, _, params = part.partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding.strip() and q > 0:
+            accepted.add(coding.strip().lower())
+    if '*' in accepted:
+        accepted |= {'br', 'gzip'}
+    return accepted
+
+
+def etag_matches(header, etag):
+    """Whether an If-None-Match header names `etag` (or is `*`)."""
+    if not header:
+        return False
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == '*' or candidate.strip('"') == etag:
+            return True
+    return False
+
+
+class Asset:
+    """One asset's bytes and their precompressed variants."""
+
+    def __init__(self, body, mimetype, path=None):
+        self.mimetype = mimetype
+        self.path = path
+        self.mtime = os.path.getmtime(path) if path else None
+        self.etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.variants = {'identity': body}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self._add_variant('gzip', gzip.compress(body, compresslevel=9, mtime=0))
+            if brotli is not None:
+                self._add_variant('br', brotli.compress(body, quality=11))
+
+    def _add_variant(self, coding, data):
+        if len(data) < len(self.variants['identity']):
+            self.variants[coding] = data
+
+    def pick(self, accept_encoding):
+        """(coding, body) for the smallest variant the client accepts."""
+        accepted = accepted_encodings(accept_encoding)
+        for coding in ('br', 'gzip'):
+            if coding in self.variants and coding in accepted:
+                return coding, self.variants[coding]
+        return 'identity', self.variants['identity']
+
+
+class AssetStore:
+    def __init__(self):
+        self._assets = {}
+        self._lock = threading.Lock()
+        self.served = 0
+        self.not_modified = 0
+
+    def add(self, name, body, mimetype):
+        """Register in-memory content (str is encoded as UTF-8)."""
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self._assets[name] = Asset(body, mimetype)
+
+    def add_file(self, name, path, mimetype):
+        with open(path, 'rb') as f:
+            self._assets[name] = Asset(f.read(), mimetype, path)
+
+    def reload(self):
+        """Re-read file-backed assets whose mtime changed. Returns their names."""
+        changed = []
+        with self._lock:
+            for name, asset in list(self._assets.items()):
+                if asset.path and os.path.getmtime(asset.path) != asset.mtime:
+                    self.add_file(name, asset.path, asset.mimetype)
+                    changed.append(name)
+        return changed
+
+    def __contains__(self, name):
+        return name in self._assets
+
+    def url(self, name):
+        """A URL for `name` that changes with its content, so it can be cached forever."""
+        return f'/{name}?v={self._assets[name].etag}'
+
+    def serve(self, name, accept_encoding=None, if_none_match=None, version=None):
+        """(status, [(header, value)], body) for a GET of asset `name`."""
+        asset = self._assets[name]
+        coding, body = asset.pick(accept_encoding)
+        etag = asset.etag if coding == 'identity' else f'{asset.etag}-{coding}'
+        headers = [
+            ('Content-Type', asset.mimetype),
+            ('ETag', f'"{etag}"'),
+            ('Cache-Control', IMMUTABLE if version == asset.etag else REVALIDATE),
+            ('Vary', 'Accept-Encoding'),
+        ]
+        if etag_matches(if_none_match, etag):
+            self.not_modified += 1
+            return 304, headers, b''
+        if coding != 'identity':
+            headers.append(('Content-Encoding', coding))
+        headers.append(('Content-Length', str(len(body))))
+        self.served += 1
+        return 200, headers, body
+
+    def stats(self):
+        return {
+            'assets': {
+                name: {coding: len(data) for coding, data in asset.variants.items()}
+                for name, asset in self._assets.items()
+            },
+            'served': self.served,
+            'not_modified': self.not_modified,
+            'brotli': brotli is not None,
+        }
@@ -0,0 +1,104 @@
+"""RedisBackend against fakeredis, the local stand-in for a Redis server."""
+import threading
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+redis = pytest.importorskip('redis')
+
+from state import FrameCodec, RedisBackend  # noqa: E402
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    """Make RedisBackends that share one fake server, like workers sharing Redis."""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, 'from_url', lambda url: fakeredis.FakeRedis(server=server))
+    return lambda: RedisBackend('redis://stand-in')
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_map_round_trip(backends):
+    one, two = backends(), backends()
+    screens = one.map('live_screens')
+    screens['alice'] = {'version': 3, 'etag': 'abc'}
+    seen = two.map('live_screens')
+    assert seen['alice'] == {'version': 3, 'etag': 'abc'}
+    assert 'alice' in seen and 'bob' not in seen
+    assert len(seen) == 1 and list(seen) == ['alice']
+    assert seen.snapshot() == {'alice': {'version': 3, 'etag': 'abc'}}
+    del seen['alice']
+    assert 'alice' not in screens
+    with pytest.raises(KeyError):
+        screens['alice']
+
+
+def test_frame_codec_round_trip(backends):
+    frames = backends().map('live_frames', FrameCodec)
+    frames['alice'] = (b'\xff\xd8\x00binary\x00', 'image/jpeg', 'etag1')
+    assert frames['alice'] == (b'\xff\xd8\x00binary\x00', 'image/jpeg', 'etag1')
+
+
+def test_pop_is_atomic(backends):
+    inbox = backends().map('signal_inbox')
+    inbox['alice\nviewer'] = {'type': 'request'}
+    maps = [backends().map('signal_inbox') for _ in range(8)]
+    results = []
+    threads = [threading.Thread(target=lambda m=m: results.append(m.pop('alice\nviewer', None))) for m in maps]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [r for r in results if r is not None] == [{'type': 'request'}]
+    assert inbox.pop('alice\nviewer', 'gone') == 'gone'
+
+
+def test_publish_reaches_every_worker(backends):
+    publisher, subscriber = backends(), backends()
+    received = []
+    subscriber.subscribe(received.append)
+    time.sleep(0.2)  # let the listener thread subscribe
+    publisher.publish({'signalFor': 'alice'})
+    assert wait_for(lambda: received == [{'signalFor': 'alice'}])
+
+
+def test_numbered_events_arrive_in_id_order(backends):
+    pytest.importorskip('lupa')  # fakeredis runs Lua scripts through it
+    subscriber = backends()
+    received = []
+    subscriber.subscribe(lambda message: received.append(message['id']))
+    time.sleep(0.2)
+    publishers = [backends() for _ in range(4)]
+
+    def publish(backend):
+        for _ in range(50):
+            backend.publish_numbered('sse_event_id', {'event': {'type': 'new_flag'}})
+
+    threads = [threading.Thread(target=publish, args=(backend,)) for backend in publishers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert wait_for(lambda: len(received) == 200)
+    assert received == list(range(1, 201))
+
+
+def test_shared_blobs_outlive_only_their_last_reference(backends, tmp_path):
+    pytest.importorskip('lupa')
+    from blob_store import BlobStore
+    one = BlobStore(tmp_path / 'one', shared=backends().shared_blobs('blobs'))
+    two = BlobStore(tmp_path / 'two', shared=backends().shared_blobs('blobs'))
+    key = one.put(b'frame bytes', 'image/jpeg')
+    assert two.get(key) == (b'frame bytes', 'image/jpeg')
+    assert two.put(b'frame bytes', 'image/jpeg') == key
+    one.release(key)
+    assert one.shared.get(key) == (b'frame bytes', 'image/jpeg')
+    two.release(key)
+    assert one.shared.get(key) is None